@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the capture and decode hot paths.
+
+Run a single benchmark with ``python scripts/benchmark.py <name>`` or all of
+them without arguments.
+"""
+from __future__ import annotations
+
+import argparse
+import timeit
+from typing import Callable
+
+# Team chat notify from docs/chat-packets.md
+CHAT_NOTIFY = bytes.fromhex(
+    "0000004e000200000000 09d4a768 00000000 00000001"
+    "0a3608031232080412140 8d0b69f171205416973753118022001280340011"
+    "89ce2d6cc0622121a1074686973206973206120746573742034".replace(" ", "")
+)
+
+
+def report(name: str, func: Callable[[], object], number: int) -> float:
+    """Time ``func`` and print the best per-call time out of five runs."""
+    best = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"  {name:<40} {best * 1e9:>10.0f} ns/call")
+    return best
+
+
+def bench_headers(number: int) -> None:
+    """Ethernet/IPv4/TCP header parsing, scapy dissection vs ``net.parse_ethernet``."""
+    from scapy.layers.inet import IP, TCP
+    from scapy.layers.l2 import Ether
+    from scapy.packet import Raw
+
+    from star_resonance_relay.net import parse_ethernet
+    from star_resonance_relay.sniffer import Endpoints
+
+    frame = bytes(
+        Ether(src="02:00:00:00:00:01", dst="02:00:00:00:00:02")
+        / IP(src="43.174.1.20", dst="192.168.1.10")
+        / TCP(sport=5003, dport=51234, seq=1000, flags="PA")
+        / Raw(CHAT_NOTIFY)
+    )
+
+    def scapy_path():
+        packet = Ether(frame)
+        if TCP not in packet or IP not in packet or Raw not in packet:
+            return None
+        return Endpoints.from_packet(packet), packet[TCP].seq, bytes(packet[Raw])
+
+    def struct_path():
+        segment = parse_ethernet(memoryview(frame))
+        return segment.flow, segment.seq, segment.payload
+
+    print("headers:")
+    slow = report("scapy Ether() + layer lookups", scapy_path, number // 10)
+    fast = report("net.parse_ethernet", struct_path, number)
+    print(f"  speedup: {slow / fast:.0f}x")
+
+
+def bench_signatures(number: int) -> None:
+    """Server discovery on non-matching payloads, per-profile checks vs one ``SignatureMatcher``."""
+    import random
+
+    from star_resonance_relay.sniffer import BPSRChatSniffer, BPSRDefaultSniffer, SnifferGroup
+    from star_resonance_relay.utils import BinaryReader
+
+    world = BPSRDefaultSniffer(print)
+    chat = BPSRChatSniffer(print)
+    group = SnifferGroup([chat, world])
+
+    def legacy(payload: bytes) -> bool:
+        # the per-profile checks as they were before the shared matcher
+        if len(payload) >= 10 and payload[4] == 0:
+            reader = BinaryReader(payload[10:])
+            while reader.remaining() >= 4:
+                frag_len = reader.read_u32() - 4
+                if frag_len < 0 or reader.remaining() < frag_len:
+                    break
+                if reader.read(frag_len)[5:11] == BPSRDefaultSniffer.SIGNATURE:
+                    return True
+        if len(payload) == 98 and payload.startswith(BPSRDefaultSniffer.SIGNATURE1) \
+                and payload[14:20] == BPSRDefaultSniffer.SIGNATURE2:
+            return True
+        return payload.startswith(BPSRChatSniffer.SIGNATURE) or BPSRChatSniffer.SIGNATURE_2 in payload
+
+    random.seed(0)
+    for size in (64, 1400):
+        # plausible framing so the legacy walk has fragments to copy
+        payload = bytearray(random.randbytes(size))
+        payload[4] = 0
+        pos = 10
+        while pos + 4 <= size:
+            payload[pos:pos + 4] = min(100, size - pos).to_bytes(4)
+            pos += 100
+        payload = bytes(payload)
+        view = memoryview(payload)
+
+        print(f"signatures ({size} byte payload):")
+        slow = report("per-profile checks (bytes copy)", lambda: legacy(bytes(view)), number)
+        fast = report("SignatureMatcher.match", lambda: group._matcher.match(view), number)
+        print(f"  speedup: {slow / fast:.1f}x")
+
+
+def bench_reassembly(number: int) -> None:
+    """Bursts of small frames per segment, ``del bytearray[:n]`` framing vs the offset buffer."""
+    import struct
+
+    from star_resonance_relay.utils import TCPReassembler
+
+    class LegacyReassembler:
+        # push/pop_frames as they were before the offset buffer, in-order segments only
+        def __init__(self) -> None:
+            self._data = bytearray()
+
+        def push(self, seq: int, payload: bytes) -> None:
+            self._data.extend(payload)
+
+        def pop_frames(self) -> list[bytes]:
+            frames = []
+            while len(self._data) >= 4:
+                frame_len = struct.unpack(">I", self._data[:4])[0]
+                if len(self._data) < frame_len:
+                    break
+                frames.append(bytes(self._data[:frame_len]))
+                del self._data[:frame_len]
+            return frames
+
+    for count in (1_000, 5_000):
+        # the last frame is cut short so every burst leaves a tail to carry over
+        segment = CHAT_NOTIFY * count + CHAT_NOTIFY[:20]
+        tail = CHAT_NOTIFY[20:]
+
+        def burst(reassembler) -> None:
+            reassembler.push(0, segment)
+            reassembler.pop_frames()
+            reassembler.push(0, tail)
+            reassembler.pop_frames()
+
+        legacy = LegacyReassembler()
+        current = TCPReassembler()
+        current.clear(0)
+
+        def current_burst() -> None:
+            current.push(current.next_seq, segment)
+            current.pop_frames()
+            current.push(current.next_seq, tail)
+            current.pop_frames()
+
+        runs = max(1, number // count)
+        print(f"reassembly ({count} frames per segment):")
+        slow = report("del bytearray[:n] + bytes copies", lambda: burst(legacy), runs)
+        fast = report("TCPReassembler offsets + memoryviews", current_burst, runs)
+        print(f"  speedup: {slow / fast:.1f}x")
+
+
+def bench_frames(number: int) -> None:
+    """Per notify frame overhead of ``process_frame``, recursive generators vs the explicit stack."""
+    import struct
+
+    import zstandard as zstd
+
+    from star_resonance_relay.processor import BPSRPacketProcessor, FragmentType
+    from star_resonance_relay.utils import BinaryReader
+
+    def legacy(frame):
+        # process_frame as it was before the explicit stack
+        reader = BinaryReader(frame)
+        while reader.remaining() > 0:
+            try:
+                pkt_len = reader.peek_u32()
+            except EOFError:
+                break
+            if pkt_len < 6 or reader.remaining() < pkt_len:
+                break
+            fragment = BinaryReader(reader.read(pkt_len))
+            fragment.read_u32()
+            frag_type_field = fragment.read_u16()
+            is_compressed = bool(frag_type_field & 0x8000)
+            try:
+                frag_type = FragmentType(frag_type_field & 0x7FFF)
+            except ValueError:
+                continue
+            match frag_type:
+                case FragmentType.NOTIFY:
+                    body = BinaryReader(fragment.read_remaining())
+                    service_uid, stub_id, method_id = body.read_u64(), body.read_u32(), body.read_u32()
+                    payload = body.read_remaining()
+                    if is_compressed:
+                        payload = zstd.decompress(payload)
+                    yield service_uid, stub_id, method_id, payload
+                case FragmentType.FRAME_DOWN:
+                    fragment.read_u32()
+                    nested = fragment.read_remaining()
+                    if is_compressed:
+                        nested = zstd.decompress(nested)
+                    for tup in legacy(nested):
+                        yield tup
+
+    def frame_down(inner: bytes) -> bytes:
+        return struct.pack(">IHI", 10 + len(inner), FragmentType.FRAME_DOWN.value, 1) + inner
+
+    processor = BPSRPacketProcessor()
+    count = 100
+    for depth in (0, 1, 3):
+        frame = CHAT_NOTIFY * count
+        for _ in range(depth):
+            frame = frame_down(frame)
+        view = memoryview(frame)
+        assert len(list(processor.process_frame(view))) == count
+
+        runs = max(1, number // count)
+        print(f"frames ({count} notify frames, FRAME_DOWN depth {depth}):")
+        slow = report("recursive generators (per burst)", lambda: list(legacy(view)), runs)
+        fast = report("explicit stack (per burst)", lambda: list(processor.process_frame(view)), runs)
+        print(f"  per frame: {slow / count * 1e9:.0f} ns -> {fast / count * 1e9:.0f} ns, speedup: {slow / fast:.1f}x")
+
+
+def bench_zstd(number: int) -> None:
+    """Compressed bundle decompression, module-level ``zstd.decompress`` vs the pooled per-thread context."""
+    import random
+
+    import zstandard as zstd
+
+    from star_resonance_relay.processor import decompress
+
+    random.seed(0)
+    # a chat burst, and a world-like bundle of small records with varying fields
+    bundles = {
+        "chat burst": CHAT_NOTIFY * 100,
+        "world bundle": b"".join(
+            CHAT_NOTIFY[:22] + random.randbytes(8) + bytes(24) + random.randbytes(4) for _ in range(1000)
+        ),
+    }
+    for name, bundle in bundles.items():
+        for content_size in (True, False):
+            compressed = zstd.ZstdCompressor(level=3, write_content_size=content_size).compress(bundle)
+            assert decompress(compressed) == bundle
+
+            if content_size:
+                def legacy():
+                    return zstd.decompress(compressed)
+                label = "zstd.decompress"
+            else:
+                # zstd.decompress cannot size the output, a fresh streaming context is the fallback
+                def legacy():
+                    return zstd.ZstdDecompressor().decompressobj().decompress(compressed)
+                label = "fresh decompressobj"
+
+            print(f"zstd ({name}, {len(compressed)} -> {len(bundle)} bytes, "
+                  f"content size {'in header' if content_size else 'missing'}):")
+            slow = report(label, legacy, number // 10)
+            fast = report("processor.decompress", lambda: decompress(compressed), number // 10)
+            print(f"  speedup: {slow / fast:.1f}x")
+
+
+def bench_batch(number: int) -> None:
+    """Decode and dispatch of a world bundle, ``dispatch`` per frame vs ``dispatch_batch``."""
+    import struct
+
+    from star_resonance_relay.processor import WORLD_NTF, BPSRPacketProcessor
+    from star_resonance_relay.proto.serv_world_ntf_pb2 import WorldNtf
+
+    delta = WorldNtf.SyncNearDeltaInfo()
+    for uuid in range(3):
+        info = delta.DeltaInfos.add()
+        info.Uuid = 1 << 40 | uuid
+    payload = delta.SerializeToString()
+    notify = struct.pack(">IHQII", 22 + len(payload), 2, WORLD_NTF, 0, 0x2D) + payload
+
+    processor = BPSRPacketProcessor()
+    count = 500
+    frames = list(processor.process_frame(notify * count))
+
+    def discard(_message: object) -> None:
+        pass
+
+    def per_frame():
+        for frame in frames:
+            processor.dispatch(frame, discard)
+
+    def batched():
+        processor.dispatch_batch(frames, discard)
+
+    runs = max(1, number // count)
+    print(f"batch ({count} SyncNearDeltaInfo notifies):")
+    slow = report("dispatch per frame (per bundle)", per_frame, runs)
+    fast = report("dispatch_batch (per bundle)", batched, runs)
+    print(f"  per frame: {slow / count * 1e9:.0f} ns -> {fast / count * 1e9:.0f} ns, speedup: {slow / fast:.1f}x")
+
+
+def bench_index(number: int) -> None:
+    """Framing of a replayed stream buffer, ``BinaryReader`` length walk vs the NumPy ``index_frames``."""
+    import random
+    import struct
+
+    from star_resonance_relay.frame_index import index_frames, process_buffer
+    from star_resonance_relay.processor import CHIT_CHAT_NTF, BPSRPacketProcessor
+    from star_resonance_relay.utils import BinaryReader
+
+    random.seed(0)
+    # mostly notifies of other methods, the chat ones a filtering replay is after
+    other = [
+        struct.pack(">IHQII", 22 + size, 2, 0x63335342, 0, 0x2D) + random.randbytes(size)
+        for size in (24, 60, 200, 700)
+    ]
+    count = 100_000
+    stream = b"".join(CHAT_NOTIFY if random.random() < 0.05 else random.choice(other) for _ in range(count))
+
+    def walk():
+        # the framing loop of process_bytes
+        frames = []
+        reader = BinaryReader(stream)
+        while reader.remaining() >= 4:
+            frame_len = reader.peek_u32()
+            if frame_len == 0 or reader.remaining() < frame_len:
+                break
+            frames.append(reader.read(frame_len))
+        return frames
+
+    assert len(walk()) == len(index_frames(stream)) == count
+
+    processor = BPSRPacketProcessor(subscriptions=[(CHIT_CHAT_NTF, 1)])
+    runs = max(1, number // count)
+    print(f"index ({count} frames, {len(stream) / 1e6:.0f} MB):")
+    slow = report("BinaryReader walk (per buffer)", walk, runs)
+    fast = report("index_frames (per buffer)", lambda: index_frames(stream), runs)
+    print(f"  per frame: {slow / count * 1e9:.0f} ns -> {fast / count * 1e9:.0f} ns, speedup: {slow / fast:.1f}x")
+    slow = report("process_bytes, chat only (per buffer)", lambda: list(processor.process_bytes(stream)), runs)
+    fast = report("process_buffer, chat only (per buffer)", lambda: list(process_buffer(processor, stream)), runs)
+    print(f"  per frame: {slow / count * 1e9:.0f} ns -> {fast / count * 1e9:.0f} ns, speedup: {slow / fast:.1f}x")
+
+
+BENCHMARKS: dict[str, Callable[[int], None]] = {
+    "headers": bench_headers,
+    "signatures": bench_signatures,
+    "reassembly": bench_reassembly,
+    "frames": bench_frames,
+    "zstd": bench_zstd,
+    "batch": bench_batch,
+    "index": bench_index,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run, all by default ({', '.join(BENCHMARKS)})")
+    parser.add_argument("-n", "--number", type=int, default=100_000, help="Iterations per timing run")
+    args = parser.parse_args()
+
+    unknown = set(args.names) - BENCHMARKS.keys()
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name](args.number)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ From: https://github.com/JordieB/bpsr_labs/blob/main/scripts/generate_protos.py
 from __future__ import annotations
 
 import argparse
+import re
 import shutil
 import subprocess
 import sys
@@ -30,6 +31,31 @@ INIT_TEMPLATE = '"""Generated protobuf modules for BPSR."""\nfrom __future__ imp
 
 PB_INIT_TEMPLATE = '"""Generated chat protobuf modules."""\n'
 
+# Service uid and method ids of the notify services, neither is part of the .proto
+# files. Keyed by proto file stem, method ids map to messages nested in its service message.
+NOTIFY_METHODS: dict[str, tuple[int, dict[int, str]]] = {
+    "serv_world_ntf": (0x0000000063335342, {
+        0x00000006: "SyncNearEntities",
+        0x00000015: "SyncContainerData",
+        0x00000016: "SyncContainerDirtyData",
+        0x0000002D: "SyncNearDeltaInfo",
+        0x0000002E: "SyncToMeDeltaInfo",
+    }),
+    "serv_chit_chat_ntf": (0x0000000009d4a768, {
+        0x00000001: "NotifyNewestChitChatMsgs",
+    }),
+}
+
+OPCODES_TEMPLATE = '''"""Notify opcodes of the generated protobuf modules, see scripts/generate_protobufs.py."""
+
+# opcode (service uid << 32 | method id) -> (module, message), imported on first use
+OPCODES: dict[int, tuple[str, str]] = {{
+{entries}}}
+'''
+
+_SERVICE_MESSAGE = re.compile(r"^message (\w+) \{", re.MULTILINE)
+_NESTED_MESSAGE = re.compile(r"^\s+message (\w+) \{", re.MULTILINE)
+
 
 def run_protoc(proto_paths: Iterable[Path], includes: Sequence[str]) -> None:
     proto_files = sorted(p for path in proto_paths for p in path.rglob("*.proto"))
@@ -78,6 +104,34 @@ def ensure_init_files() -> None:
     (pb_dir / "__init__.py").write_text(PB_INIT_TEMPLATE, encoding="utf-8")
 
 
+def write_opcode_table() -> None:
+    """Write ``opcodes.py``, mapping notify opcodes to messages of the ``serv_*_ntf`` modules.
+
+    The table only names modules and messages, so importing it does not
+    import any generated module.
+    """
+    entries = []
+    for proto in sorted((STAR_DATA / "zproto").glob("serv_*_ntf.proto")):
+        if proto.stem not in NOTIFY_METHODS:
+            print(f"No method ids known for {proto.stem}, skipping")
+            continue
+        service_uid, methods = NOTIFY_METHODS[proto.stem]
+        text = proto.read_text(encoding="utf-8")
+        service = _SERVICE_MESSAGE.search(text)
+        if service is None:
+            print(f"No service message in {proto.name}, skipping")
+            continue
+        nested = set(_NESTED_MESSAGE.findall(text))
+        for method_id, name in sorted(methods.items()):
+            if name not in nested:
+                print(f"{service.group(1)} has no message {name}, skipping method 0x{method_id:08x}")
+                continue
+            entries.append(
+                f'    0x{service_uid:016x}_{method_id:08x}: ("{proto.stem}_pb2", "{service.group(1)}.{name}"),\n'
+            )
+    (OUT_DIR / "opcodes.py").write_text(OPCODES_TEMPLATE.format(entries="".join(entries)), encoding="utf-8")
+
+
 def clean_generated() -> None:
     if OUT_DIR.exists():
         for path in OUT_DIR.iterdir():
@@ -90,6 +144,7 @@ def clean_generated() -> None:
 def main() -> None:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--clean", action="store_true", help="Remove previously proto modules")
+    parser.add_argument("--opcodes", action="store_true", help="Only regenerate the notify opcode table")
     args = parser.parse_args()
 
     # Check if refs/StarResonanceData exists
@@ -101,6 +156,10 @@ def main() -> None:
             "2. Or manually clone the repository: git clone https://github.com/BlueSky-07/StarResonanceData.git refs/StarResonanceData")
         return
 
+    if args.opcodes:
+        write_opcode_table()
+        return
+
     if args.clean:
         clean_generated()
 
@@ -117,6 +176,7 @@ def main() -> None:
         run_single(base_dir, [str(STAR_DATA)], list(files))
 
     ensure_init_files()
+    write_opcode_table()
 
 
 if __name__ == "__main__":
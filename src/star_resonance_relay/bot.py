@@ -1,13 +1,17 @@
+import asyncio
 import logging
 import os
 
 import requests
 from discord import Intents, SyncWebhook, Embed
+from discord.ext import tasks
 from discord.ext.commands import Bot
 from google.protobuf.message import Message
-from scapy.sendrecv import AsyncSniffer
 
+from star_resonance_relay.capture import ScapyCapture, PacketRingCapture
 from star_resonance_relay.const.item import ITEM_NAME_MAPPING
+from star_resonance_relay.pipeline import SnifferPipeline, Backpressure
+from star_resonance_relay.processor import CHIT_CHAT_NTF, registry
 from star_resonance_relay.proto.enum_chit_chat_channel_type_pb2 import ChitChatChannelType
 from star_resonance_relay.proto.enum_chit_chat_msg_type_pb2 import ChitChatMsgType
 from star_resonance_relay.proto.enum_place_holder_type_pb2 import PlaceHolderType
@@ -26,7 +30,9 @@ from star_resonance_relay.proto.stru_place_holder_str_pb2 import PlaceHolderStr
 from star_resonance_relay.proto.stru_place_holder_timestamp_pb2 import PlaceHolderTimestamp
 from star_resonance_relay.proto.stru_place_holder_union_pb2 import PlaceHolderUnion
 from star_resonance_relay.proto.stru_place_holder_val_pb2 import PlaceHolderVal
-from star_resonance_relay.sniffer import BPSRChatSniffer
+from star_resonance_relay.sniffer import PROFILES, Sniffer, SnifferGroup
+from star_resonance_relay.state import FlowLockCache
+from star_resonance_relay.wire import find_varint
 
 logger = logging.getLogger(__name__)
 
@@ -238,7 +244,7 @@ class BPSRRelayBot(Bot):
         PlaceHolderType.PlaceHolderTypeScenePosition: PlaceHolderScenePosition,
     }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, capture: bool = True, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.webhook_url = os.getenv("WEBHOOK_URL")
@@ -250,12 +256,75 @@ class BPSRRelayBot(Bot):
             if channel_type:
                 self.channel_types.append(channel_type)
 
-        self.listener = BPSRChatSniffer(self.on_bpsr_message)
         self.session = requests.Session()
+        self.listener: SnifferGroup | None = None
+        self.pipeline: SnifferPipeline | None = None
+        if not capture:
+            return
+
+        # drop chat of other channels before it is parsed
+        registry.register(
+            CHIT_CHAT_NTF, 0x00000001, ChitChatNtf.NotifyNewestChitChatMsgs, accept=self._accepts_channel
+        )
 
-        self.sniffer = AsyncSniffer(prn=lambda pkt: self.listener.handle_packet(pkt), store=False)
+        # one capture shared by every sniffer profile, e.g. "chat,world"
+        max_flows = int(os.getenv("MAX_FLOWS", "1"))
+        # bytes the reassemblers of each profile may hold
+        budget = int(os.getenv("REASSEMBLY_BUDGET", str(1 << 26)))
+        cache = FlowLockCache(os.getenv("STATE_FILE")) if os.getenv("STATE_FILE") else None
+        # time game server calls, logged with every idle sweep
+        self.track_rpc = os.getenv("TRACK_RPC", "0") == "1"
+        self.listener = SnifferGroup(
+            [PROFILES[profile](self.on_bpsr_message, max_flows=max_flows, cache=cache,
+                               reassembly_budget=budget, track_rpc=self.track_rpc)
+             for profile in os.getenv("SNIFFER_PROFILES", "chat").split(",")],
+            on_lock=lambda endpoints: self.sniffer.follow(endpoints)
+        )
+        # decode on a separate thread unless DECODE_QUEUE_SIZE is 0
+        handler = self.listener
+        queue_size = int(os.getenv("DECODE_QUEUE_SIZE", "8192"))
+        if queue_size > 0:
+            self.pipeline = SnifferPipeline(
+                self.listener,
+                queue_size,
+                Backpressure(os.getenv("BACKPRESSURE", Backpressure.DROP_OLDEST.value))
+            )
+            self.pipeline.start()
+            handler = self.pipeline
+
+        iface = os.getenv("CAPTURE_IFACE")
+        match os.getenv("CAPTURE_BACKEND", "scapy"):
+            case "af_packet":
+                self.sniffer = PacketRingCapture(handler.handle_frame, iface=iface)
+            case _:
+                self.sniffer = ScapyCapture(handler.handle_packet, iface=iface)
         self.sniffer.start()
 
+    async def setup_hook(self) -> None:
+        if self.listener is not None:
+            self.sweep_idle_flows.start()
+
+    @tasks.loop(seconds=Sniffer.SWEEP_INTERVAL)
+    async def sweep_idle_flows(self) -> None:
+        # the sniffer lock may be held by the decode thread, keep the event loop (and heartbeat) running
+        await asyncio.to_thread(self._sweep_idle_flows)
+
+    def _sweep_idle_flows(self) -> None:
+        # a silent flow brings no traffic to trigger the sweep once the capture filter is narrowed
+        self.listener.evict_idle()
+        if isinstance(self.sniffer, PacketRingCapture):
+            packets, drops = self.sniffer.stats()
+            logger.info(f"Captured {packets} packets since the last sweep, {drops} dropped by the kernel")
+        if self.pipeline is not None:
+            ring = self.pipeline.stats()
+            logger.info(f"Decode queue holding {ring.size} of {ring.capacity} segments, "
+                        f"{ring.dropped} of {ring.pushed} dropped so far")
+        if self.track_rpc:
+            rpc = self.listener.rpc_latencies()
+            logger.info(f"Paired {rpc.stats.returns} of {rpc.stats.calls} calls, {rpc.stats.timeouts} timed out")
+            for line in rpc.summary():
+                logger.info(line)
+
     def _decode_placeholder(self, placeholder: PlaceHolder) -> (
             PlaceHolderVal
             | PlaceHolderPlayer
@@ -280,6 +349,11 @@ class BPSRRelayBot(Bot):
             logger.warning("Failed to decode %s: %s", placeholder, exc)
             raise
 
+    def _accepts_channel(self, payload: bytes | memoryview) -> bool:
+        # NotifyNewestChitChatMsgs.v_request.channel_type, read straight off the wire
+        channel = find_varint(payload, (1, 1))
+        return channel is None or channel in self.channel_types
+
     def on_bpsr_message(self, payload: Message) -> None:
         if not isinstance(payload, ChitChatNtf.NotifyNewestChitChatMsgs):
             return
@@ -0,0 +1,241 @@
+import logging
+import mmap
+import select
+import socket
+import struct
+import threading
+from typing import Callable, Sequence
+
+from scapy.config import conf
+from scapy.interfaces import resolve_iface
+from scapy.packet import Packet
+from scapy.sendrecv import AsyncSniffer
+
+from star_resonance_relay.sniffer import Endpoints
+
+logger = logging.getLogger(__name__)
+
+# Broad program used while no flow is locked, every TCP segment is a
+# discovery candidate.
+DISCOVERY_FILTER = "tcp"
+
+# Largest captured frame still let through once narrowed, room for the packets the
+# sniffer signatures look for (login response, scene change, chat hello) and
+# their link/IP/TCP headers.
+SIGNATURE_MAX_LEN = 512
+# Small TCP segments carrying data, so that a scene change to a new server flow is
+# still seen while the filter is narrowed, and relocks like it would unfiltered.
+SIGNATURE_CLAUSE = (
+    f"(tcp and len <= {SIGNATURE_MAX_LEN} "
+    "and ip[2:2] - ((ip[0] & 0xf) << 2) - ((tcp[12] & 0xf0) >> 2) > 0)"
+)
+
+
+def flow_filter(endpoints: Sequence[Endpoints] | None) -> str:
+    """Build the BPF program matching the locked flows in both directions.
+
+    Small segments of any other flow are kept too, see ``SIGNATURE_CLAUSE``.
+    Falls back to ``DISCOVERY_FILTER`` when no flow is locked.
+    """
+    if not endpoints:
+        return DISCOVERY_FILTER
+    return "(tcp and (" + " or ".join(
+        f"(host {flow.source.ip} and port {flow.source.port})" for flow in endpoints
+    ) + f")) or {SIGNATURE_CLAUSE}"
+
+
+class ScapyCapture:
+    """Capture packets with scapy's ``AsyncSniffer`` behind a swappable BPF filter.
+
+    The listening socket is opened up front so that its kernel filter can be
+    replaced in place while the sniffer keeps running, without restarting the
+    capture thread or dropping the socket buffer.
+    """
+
+    def __init__(self, handler: Callable[[Packet], None], iface: str | None = None):
+        self._iface = resolve_iface(iface or conf.iface)
+        self._filter = DISCOVERY_FILTER
+        self._socket = self._iface.l2listen()(iface=self._iface, filter=self._filter)
+        self._sniffer = AsyncSniffer(opened_socket=self._socket, prn=handler, store=False)
+
+    @property
+    def filter(self) -> str:
+        return self._filter
+
+    def set_filter(self, bpf_filter: str) -> None:
+        """Atomically replace the kernel filter of the listening socket."""
+        if bpf_filter == self._filter:
+            return
+
+        if hasattr(self._socket, "pcap_fd"):
+            # libpcap backed sockets (Windows, BSD, ``conf.use_pcap``)
+            self._socket.pcap_fd.setfilter(bpf_filter)
+        else:
+            from scapy.arch.linux import attach_filter
+            attach_filter(self._socket.ins, bpf_filter, self._iface)
+
+        logger.info(f"Capture filter set to {bpf_filter!r}")
+        self._filter = bpf_filter
+
+    def follow(self, endpoints: Sequence[Endpoints] | None) -> None:
+        """Narrow the filter to the locked flows, or widen it again on unlock."""
+        try:
+            self.set_filter(flow_filter(endpoints))
+        except Exception:
+            logger.exception("Failed to update capture filter")
+
+    def start(self) -> None:
+        self._sniffer.start()
+
+    def stop(self) -> None:
+        self._sniffer.stop()
+        self._socket.close()
+
+
+# linux/if_packet.h
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+ETH_P_ALL = 0x0003
+
+_TPACKET_REQ3 = struct.Struct("=7I")
+_TPACKET_STATS_V3 = struct.Struct("=3I")
+# tpacket_block_desc: version, offset_to_priv, then tpacket_hdr_v1 starting with
+# block_status, num_pkts, offset_to_first_pkt
+_BLOCK_STATUS = struct.Struct("=I")
+_BLOCK_HDR = struct.Struct("=III")
+_BLOCK_STATUS_OFFSET = 8
+# tpacket3_hdr: tp_next_offset, tp_sec, tp_nsec, tp_snaplen, tp_len, tp_status, tp_mac
+_PACKET_HDR = struct.Struct("=IIIIIIH")
+
+
+class PacketRingCapture:
+    """Capture frames from a memory-mapped ``AF_PACKET`` ring (``TPACKET_V3``).
+
+    Linux only. The kernel fills whole blocks of frames into a ring shared with
+    this process, so receiving a frame costs neither a syscall nor a scapy
+    dissection. ``handler`` is called with ``(timestamp, frame)`` where
+    ``frame`` is a memoryview into the ring starting at the link-layer header.
+    The view is only valid for the duration of the call, the block is handed
+    back to the kernel right after, so handlers must copy whatever they keep.
+    """
+
+    def __init__(
+            self,
+            handler: Callable[[float, memoryview], None],
+            iface: str | None = None,
+            block_size: int = 1 << 20,
+            block_count: int = 32,
+            frame_size: int = 1 << 11,
+            block_timeout_ms: int = 64
+    ):
+        self._handler = handler
+        self._iface = iface
+        self._filter = DISCOVERY_FILTER
+        self._block_size = block_size
+        self._block_count = block_count
+
+        self._socket = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        self._socket.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+        self._attach_filter(self._filter)
+        self._socket.setsockopt(SOL_PACKET, PACKET_RX_RING, _TPACKET_REQ3.pack(
+            block_size,
+            block_count,
+            frame_size,
+            block_size * block_count // frame_size,
+            block_timeout_ms,
+            0,  # tp_sizeof_priv
+            0  # tp_feature_req_word
+        ))
+        self._ring = mmap.mmap(
+            self._socket.fileno(),
+            block_size * block_count,
+            mmap.MAP_SHARED,
+            mmap.PROT_READ | mmap.PROT_WRITE
+        )
+        if iface:
+            self._socket.bind((iface, ETH_P_ALL))
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="PacketRingCapture", daemon=True)
+
+    @property
+    def filter(self) -> str:
+        return self._filter
+
+    def _attach_filter(self, bpf_filter: str) -> None:
+        from scapy.arch.linux import attach_filter
+        attach_filter(self._socket, bpf_filter, self._iface or conf.iface)
+
+    def set_filter(self, bpf_filter: str) -> None:
+        """Atomically replace the kernel filter in front of the ring."""
+        if bpf_filter == self._filter:
+            return
+
+        self._attach_filter(bpf_filter)
+        logger.info(f"Capture filter set to {bpf_filter!r}")
+        self._filter = bpf_filter
+
+    def follow(self, endpoints: Sequence[Endpoints] | None) -> None:
+        """Narrow the filter to the locked flows, or widen it again on unlock."""
+        try:
+            self.set_filter(flow_filter(endpoints))
+        except Exception:
+            logger.exception("Failed to update capture filter")
+
+    def stats(self) -> tuple[int, int]:
+        """Return ``(packets, drops)`` counted by the kernel since the last call."""
+        packets, drops, _freeze_count = _TPACKET_STATS_V3.unpack(
+            self._socket.getsockopt(SOL_PACKET, PACKET_STATISTICS, _TPACKET_STATS_V3.size)
+        )
+        return packets, drops
+
+    def _read_block(self, block: int) -> None:
+        ring = memoryview(self._ring)
+        try:
+            num_packets, offset, _block_len = _BLOCK_HDR.unpack_from(ring, block + _BLOCK_STATUS_OFFSET + 4)
+            offset += block
+            for _ in range(num_packets):
+                next_offset, sec, nsec, snaplen, _length, _status, mac = _PACKET_HDR.unpack_from(ring, offset)
+                start = offset + mac
+                try:
+                    self._handler(sec + nsec * 1e-9, ring[start: start + snaplen])
+                except Exception:
+                    logger.exception("Capture handler failed")
+                offset += next_offset
+        finally:
+            ring.release()
+
+    def _run(self) -> None:
+        poller = select.poll()
+        poller.register(self._socket.fileno(), select.POLLIN | select.POLLERR)
+
+        current = 0
+        while not self._stop.is_set():
+            block = current * self._block_size
+            if not _BLOCK_STATUS.unpack_from(self._ring, block + _BLOCK_STATUS_OFFSET)[0] & TP_STATUS_USER:
+                poller.poll(100)
+                continue
+
+            self._read_block(block)
+            # hand the block back to the kernel
+            _BLOCK_STATUS.pack_into(self._ring, block + _BLOCK_STATUS_OFFSET, TP_STATUS_KERNEL)
+            current = (current + 1) % self._block_count
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        try:
+            self._ring.close()
+        except BufferError:
+            # a handler kept a view into the ring, the mapping goes once that view is collected
+            logger.warning("Capture ring still referenced by a frame view, leaving it mapped")
+        finally:
+            self._socket.close()
@@ -0,0 +1,184 @@
+"""Vectorised index of the frames in a reassembled stream buffer, for offline replay.
+
+Needs NumPy, which is not a dependency of the relay itself: install the
+``replay`` extra to replay with it, see ``replay --index``.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from star_resonance_relay.processor import MAX_FRAME_LENGTH, BPSRPacketProcessor, FragmentType, NotifyFrame
+
+logger = logging.getLogger(__name__)
+
+# positions scanned for header candidates at a time, bounds the temporary masks
+_BLOCK_SIZE = 1 << 24
+_HEADER_SIZE = 6
+_NOTIFY_HEADER_SIZE = 16
+
+
+@dataclass(slots=True, frozen=True)
+class FrameIndex:
+    """Frames found back to back from the start of a buffer, one array element per frame.
+
+    Only top-level frames are indexed, ``FRAME_DOWN`` bundles are left to
+    ``BPSRPacketProcessor.process_frame`` to unpack.
+
+    Attributes:
+        offset: Offset of each frame in the buffer.
+        length: Frame length, header included.
+        fragment_type: ``FragmentType`` value, without the compression flag.
+        compressed: Whether the compression flag is set.
+        end: Offset of the first byte not covered by a complete frame, where
+            a partial frame or malformed data starts, or the buffer length.
+    """
+
+    offset: "np.ndarray"
+    length: "np.ndarray"
+    fragment_type: "np.ndarray"
+    compressed: "np.ndarray"
+    end: int
+
+    def __len__(self) -> int:
+        return len(self.offset)
+
+    def of_type(self, *fragment_types: FragmentType) -> "np.ndarray":
+        """Mask of the frames of any of ``fragment_types``."""
+        return np.isin(self.fragment_type, [t.value for t in fragment_types])
+
+    def notify_mask(self, data: bytes | memoryview, methods: Iterable[tuple[int, int]]) -> "np.ndarray":
+        """Mask of the Notify frames of any ``(service_uid, method_id)`` in ``methods``.
+
+        Read straight from the Notify headers, which are never compressed,
+        without touching any payload.
+        """
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        mask = (self.fragment_type == FragmentType.NOTIFY.value) & (self.length >= _HEADER_SIZE + _NOTIFY_HEADER_SIZE)
+        start = self.offset[mask] + _HEADER_SIZE
+        service_uid = _gather(buffer, start, 8, np.uint64)
+        method_id = _gather(buffer, start + 12, 4, np.uint32)
+        selected = np.zeros(len(start), dtype=bool)
+        for uid, method in methods:
+            selected |= (service_uid == uid) & (method_id == method)
+        mask[mask] = selected
+        return mask
+
+    def frames(self, data: bytes | memoryview, mask: "np.ndarray | None" = None) -> Iterator[memoryview]:
+        """Views of the frames, or of those selected by ``mask``."""
+        view = memoryview(data)
+        offsets, lengths = (self.offset, self.length) if mask is None else (self.offset[mask], self.length[mask])
+        for offset, length in zip(offsets.tolist(), lengths.tolist()):
+            yield view[offset:offset + length]
+
+
+def _gather(buffer: "np.ndarray", start: "np.ndarray", size: int, dtype: type) -> "np.ndarray":
+    """Big-endian unsigned integers of ``size`` bytes at every offset in ``start``."""
+    value = np.zeros(len(start), dtype=dtype)
+    for i in range(size):
+        value = (value << dtype(8)) | buffer[start + i].astype(dtype)
+    return value
+
+
+def _candidates(buffer: "np.ndarray") -> "np.ndarray":
+    """Offsets of every plausible frame header, the same shape ``find_frame_header`` scans for."""
+    found = []
+    last = len(buffer) - _HEADER_SIZE
+    for block in range(0, last + 1, _BLOCK_SIZE):
+        stop = min(block + _BLOCK_SIZE, last + 1)
+        # known fragment type and length below MAX_FRAME_LENGTH, tested in place over
+        # every byte, so the mask handed to flatnonzero is already sparse
+        mask = buffer[block + 5:stop + 5] - np.uint8(FragmentType.CALL.value)
+        mask = mask <= FragmentType.FRAME_DOWN.value - FragmentType.CALL.value
+        mask &= buffer[block:stop] == 0
+        mask &= buffer[block + 1:stop + 1] <= MAX_FRAME_LENGTH >> 16
+        offsets = np.flatnonzero(mask) + block
+        # compression flag alone, only over the positions left
+        flags = buffer[offsets + 4]
+        found.append(offsets[(flags == 0) | (flags == 0x80)])
+    return np.concatenate(found) if found else np.zeros(0, dtype=np.intp)
+
+
+def index_frames(data: bytes | memoryview) -> FrameIndex:
+    """Index the frames laid back to back from the start of ``data``.
+
+    Every plausible header is found at once with array operations, each one
+    pointing at where its frame ends. The chain starting at offset 0 is then
+    followed by pointer doubling: ``log2(frames)`` passes over the candidates
+    instead of one Python step per frame. The chain stops at the first
+    malformed or partial frame, see ``FrameIndex.end``.
+
+    Raises:
+        ImportError: If NumPy is not installed.
+    """
+    if np is None:
+        raise ImportError("index_frames needs NumPy, install the replay extra")
+
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    size = len(buffer)
+    positions = _candidates(buffer)
+    lengths = _gather(buffer, positions, 4, np.uint32).astype(np.int64)
+    valid = (lengths >= _HEADER_SIZE) & (lengths <= MAX_FRAME_LENGTH)
+    positions, lengths = positions[valid], lengths[valid]
+
+    if len(positions) == 0 or positions[0] != 0:
+        return FrameIndex(
+            np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8),
+            np.zeros(0, dtype=bool), 0
+        )
+
+    # index of the candidate each frame is followed by, or the sentinel len(positions)
+    sentinel = len(positions)
+    ends = positions + lengths
+    following = np.searchsorted(positions, ends)
+    following[(following == sentinel) | (positions[np.minimum(following, sentinel - 1)] != ends)] = sentinel
+    jump = np.append(following, sentinel)
+
+    # chain holds the first 2**k frames, jump leads 2**k frames ahead
+    chain = np.zeros(1, dtype=np.intp)
+    while True:
+        ahead = jump[chain]
+        stop = np.flatnonzero(ahead == sentinel)
+        if len(stop):
+            chain = np.concatenate((chain, ahead[:stop[0]]))
+            break
+        chain = np.concatenate((chain, ahead))
+        jump = jump[jump]
+
+    # the last frame may run past the end of the buffer
+    if ends[chain[-1]] > size:
+        chain = chain[:-1]
+    offset = positions[chain].astype(np.int64)
+    length = lengths[chain]
+    return FrameIndex(
+        offset=offset,
+        length=length,
+        # the high byte of the type field is only the compression flag, see ``_candidates``
+        fragment_type=buffer[offset + 5],
+        compressed=buffer[offset + 4] == 0x80,
+        end=int(offset[-1] + length[-1]) if len(chain) else 0
+    )
+
+
+def process_buffer(processor: BPSRPacketProcessor, data: bytes | memoryview) -> Iterator[NotifyFrame]:
+    """``processor.process_bytes`` over an indexed buffer.
+
+    Notify frames of methods the processor is not subscribed to, and RPC
+    fragments it does not track, are dropped in bulk from the index, so only
+    the frames left are walked one by one.
+    """
+    index = index_frames(data)
+    mask = index.of_type(FragmentType.FRAME_DOWN)
+    subscriptions = processor.subscriptions
+    if subscriptions is None:
+        mask |= index.of_type(FragmentType.NOTIFY)
+    else:
+        mask |= index.notify_mask(data, subscriptions)
+    if processor.rpc is not None:
+        mask |= index.of_type(FragmentType.CALL, FragmentType.RETURN, FragmentType.ECHO, FragmentType.FRAME_UP)
+    for frame in index.frames(data, mask):
+        yield from processor.process_frame(frame)
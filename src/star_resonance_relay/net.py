@@ -0,0 +1,140 @@
+import socket
+import struct
+from dataclasses import dataclass
+
+# pcap LINKTYPE_* values of the link layers the sniffer understands
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL2 = 276
+
+ETH_P_IP = 0x0800
+ETH_P_8021Q = 0x8100
+IPPROTO_TCP = 6
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+
+# Only the fields the sniffer needs are unpacked, everything else is padding.
+_ETHER_TYPE = struct.Struct(">12xH")  # dst, src, ethertype
+_VLAN_TYPE = struct.Struct(">2xH")  # tci, encapsulated ethertype
+# version/ihl, total length, flags/fragment offset, protocol, source, destination
+_IPV4_HEADER = struct.Struct(">BxH2xHxB2xII")
+# source port, destination port, sequence number, data offset, flags
+_TCP_HEADER = struct.Struct(">HHI4xBB")
+
+_SLL_PROTOCOL = struct.Struct(">14xH")  # Linux cooked capture v1, 16 byte header
+_SLL2_PROTOCOL = struct.Struct(">H18x")  # Linux cooked capture v2, 20 byte header
+
+_ETHER_LEN = _ETHER_TYPE.size
+_VLAN_LEN = _VLAN_TYPE.size
+_NULL_LEN = 4
+_AF_INET = 2
+
+
+def flow_key(src: int, sport: int, dst: int, dport: int) -> int:
+    """Pack a directional IPv4 4-tuple into a single 96-bit integer."""
+    return (src << 64) | (sport << 48) | (dst << 16) | dport
+
+
+def reverse_flow_key(key: int) -> int:
+    """Flow key of the opposite direction of the same connection."""
+    return ((key & 0xFFFFFFFF_FFFF) << 48) | (key >> 48)
+
+
+def unpack_flow_key(key: int) -> tuple[str, int, str, int]:
+    """Expand a flow key back into ``(src_ip, sport, dst_ip, dport)``."""
+    return (
+        socket.inet_ntoa((key >> 64).to_bytes(4)),
+        (key >> 48) & 0xFFFF,
+        socket.inet_ntoa(((key >> 16) & 0xFFFFFFFF).to_bytes(4)),
+        key & 0xFFFF,
+    )
+
+
+@dataclass(slots=True)
+class TCPSegment:
+    """A TCP segment stripped down to what the sniffer needs.
+
+    Attributes:
+        flow: Directional flow key, see ``flow_key``.
+        seq: TCP sequence number of the first payload byte.
+        flags: TCP flags byte.
+        payload: View of the TCP payload, never copied from the captured frame.
+        timestamp: Capture time in seconds since the epoch, None if the
+            capture did not provide one.
+    """
+
+    flow: int
+    seq: int
+    flags: int
+    payload: memoryview
+    timestamp: float | None = None
+
+
+def parse_ipv4(packet: memoryview, offset: int = 0) -> TCPSegment | None:
+    """Parse an IPv4 packet carrying TCP starting at ``offset``.
+
+    Returns None for anything that is not an unfragmented IPv4/TCP packet.
+    """
+    if len(packet) - offset < _IPV4_HEADER.size:
+        return None
+    ver_ihl, total_len, frag, proto, src, dst = _IPV4_HEADER.unpack_from(packet, offset)
+    # headers shorter than the minimum 5 words would put the payload inside them
+    if ver_ihl >> 4 != 4 or ver_ihl & 0x0F < 5 or proto != IPPROTO_TCP or frag & 0x3FFF:
+        return None
+
+    # total length rather than the captured length, frames may be padded
+    end = min(offset + total_len, len(packet))
+    offset += (ver_ihl & 0x0F) << 2
+    if end - offset < _TCP_HEADER.size:
+        return None
+    sport, dport, seq, data_offset, flags = _TCP_HEADER.unpack_from(packet, offset)
+    if data_offset >> 4 < 5:
+        return None
+    offset += (data_offset >> 4) << 2
+    if offset > end:
+        return None
+
+    return TCPSegment(flow_key(src, sport, dst, dport), seq, flags, packet[offset:end])
+
+
+def parse_ethernet(frame: memoryview) -> TCPSegment | None:
+    """Parse an Ethernet frame (optionally 802.1Q tagged) carrying IPv4/TCP."""
+    if len(frame) < _ETHER_LEN:
+        return None
+    ether_type = _ETHER_TYPE.unpack_from(frame)[0]
+    offset = _ETHER_LEN
+    if ether_type == ETH_P_8021Q:
+        if len(frame) < offset + _VLAN_LEN:
+            return None
+        ether_type = _VLAN_TYPE.unpack_from(frame, offset)[0]
+        offset += _VLAN_LEN
+    if ether_type != ETH_P_IP:
+        return None
+    return parse_ipv4(frame, offset)
+
+
+def parse_link(linktype: int, frame: memoryview) -> TCPSegment | None:
+    """Parse a captured frame of the given pcap link type."""
+    if linktype == LINKTYPE_ETHERNET:
+        return parse_ethernet(frame)
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        return parse_ipv4(frame)
+    if linktype == LINKTYPE_LINUX_SLL:
+        if len(frame) < _SLL_PROTOCOL.size or _SLL_PROTOCOL.unpack_from(frame)[0] != ETH_P_IP:
+            return None
+        return parse_ipv4(frame, _SLL_PROTOCOL.size)
+    if linktype == LINKTYPE_LINUX_SLL2:
+        if len(frame) < _SLL2_PROTOCOL.size or _SLL2_PROTOCOL.unpack_from(frame)[0] != ETH_P_IP:
+            return None
+        return parse_ipv4(frame, _SLL2_PROTOCOL.size)
+    if linktype == LINKTYPE_NULL:
+        # address family in the capturing host's byte order
+        if len(frame) < _NULL_LEN or _AF_INET not in (frame[0], frame[3]):
+            return None
+        return parse_ipv4(frame, _NULL_LEN)
+    return None
@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+
+from scapy.layers.inet import TCP, IP
+from scapy.packet import Packet
+
+from star_resonance_relay.net import TCPSegment, TCP_FIN, TCP_SYN, TCP_RST, parse_ethernet
+from star_resonance_relay.sniffer import Sniffer, SnifferGroup, segment_from_packet
+
+logger = logging.getLogger(__name__)
+
+
+class Backpressure(Enum):
+    """What the capture side does when the decode stage falls behind."""
+
+    DROP_OLDEST = "drop_oldest"
+    BLOCK = "block"
+
+
+@dataclass(slots=True, frozen=True)
+class RingStats:
+    capacity: int
+    size: int
+    pushed: int
+    dropped: int
+
+
+class SegmentRing:
+    """Bounded single-producer, single-consumer ring of TCP segments.
+
+    All slots are allocated up front. When the ring is full, ``push`` either
+    overwrites the oldest queued segment or blocks until the consumer catches
+    up, depending on ``policy``. Every overwritten segment is counted in
+    ``dropped``.
+    """
+
+    def __init__(self, capacity: int, policy: Backpressure = Backpressure.DROP_OLDEST):
+        self._slots: list[TCPSegment | None] = [None] * capacity
+        self._capacity = capacity
+        self._policy = policy
+        self._head = 0  # index of the oldest queued segment
+        self._size = 0
+        self._pushed = 0
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    def stats(self) -> RingStats:
+        with self._lock:
+            return RingStats(self._capacity, self._size, self._pushed, self._dropped)
+
+    def push(self, segment: TCPSegment) -> None:
+        with self._lock:
+            if self._size == self._capacity:
+                if self._policy is Backpressure.BLOCK:
+                    while self._size == self._capacity:
+                        self._not_full.wait()
+                else:
+                    # overwrite the oldest segment
+                    self._slots[self._head] = None
+                    self._head = (self._head + 1) % self._capacity
+                    self._size -= 1
+                    self._dropped += 1
+
+            self._slots[(self._head + self._size) % self._capacity] = segment
+            self._size += 1
+            self._pushed += 1
+            self._not_empty.notify()
+
+    def pop_batch(self, limit: int, timeout: float | None = None) -> list[TCPSegment]:
+        """Take up to ``limit`` queued segments, waiting up to ``timeout`` for the first one."""
+        with self._lock:
+            if not self._size:
+                self._not_empty.wait(timeout)
+
+            count = min(limit, self._size)
+            batch = []
+            for _ in range(count):
+                batch.append(self._slots[self._head])
+                self._slots[self._head] = None
+                self._head = (self._head + 1) % self._capacity
+            self._size -= count
+
+            if count:
+                self._not_full.notify()
+            return batch
+
+
+class SnifferPipeline:
+    """Run a ``Sniffer`` on its own decode thread, fed by the capture thread through a ``SegmentRing``.
+
+    The capture side only parses headers and copies the payload out of the
+    capture buffer, so slow decoding or a blocking webhook call no longer
+    stalls the capture and makes the kernel drop packets. Exposes the same
+    ``handle_packet`` / ``handle_frame`` entry points as ``Sniffer``.
+    """
+
+    BATCH_SIZE = 256
+    # minimum seconds between two drop warnings
+    REPORT_INTERVAL = 10.0
+
+    def __init__(
+            self,
+            sniffer: Sniffer | SnifferGroup,
+            capacity: int = 8192,
+            policy: Backpressure = Backpressure.DROP_OLDEST
+    ):
+        self._sniffer = sniffer
+        self._ring = SegmentRing(capacity, policy)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="SnifferPipeline", daemon=True)
+
+    def stats(self) -> RingStats:
+        return self._ring.stats()
+
+    def _push(self, segment: TCPSegment) -> None:
+        # bare ACKs carry nothing the sniffer needs
+        if not segment.payload and not segment.flags & (TCP_SYN | TCP_FIN | TCP_RST):
+            return
+        self._ring.push(segment)
+
+    def handle_packet(self, packet: Packet) -> None:
+        if TCP in packet and IP in packet:
+            self._push(segment_from_packet(packet))
+
+    def handle_frame(self, timestamp: float, frame: memoryview) -> None:
+        segment = parse_ethernet(frame)
+        if segment is not None:
+            # the frame lives in the capture ring, keep a copy of the payload
+            segment.payload = memoryview(bytes(segment.payload))
+            segment.timestamp = timestamp
+            self._push(segment)
+
+    def _run(self) -> None:
+        reported_drops = 0
+        next_report = 0.0
+        while not self._stop.is_set():
+            for segment in self._ring.pop_batch(self.BATCH_SIZE, timeout=0.5):
+                self._sniffer.handle_segment(segment)
+
+            if self._ring.dropped != reported_drops and time.monotonic() >= next_report:
+                next_report = time.monotonic() + self.REPORT_INTERVAL
+                logger.warning(f"Decode stage fell behind, {self._ring.dropped - reported_drops} segments dropped "
+                               f"({self._ring.dropped} total)")
+                reported_drops = self._ring.dropped
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
@@ -1,13 +1,18 @@
+import importlib
 import logging
-from dataclasses import dataclass
+import re
+import struct
+import threading
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import Iterator
+from itertools import repeat
+from typing import Callable, Iterable, Iterator, Mapping
 
 import zstandard as zstd  # Optional, used for compressed fragments
 from google.protobuf.message import Message
 
-from star_resonance_relay.proto.serv_chit_chat_ntf_pb2 import ChitChatNtf
-from star_resonance_relay.proto.serv_world_ntf_pb2 import WorldNtf
+from star_resonance_relay.proto.opcodes import OPCODES
+from star_resonance_relay.rpc import RpcTracker
 from star_resonance_relay.utils import BinaryReader
 
 logger = logging.getLogger(__name__)
@@ -25,6 +30,113 @@ class FragmentType(Enum):
     FRAME_DOWN = 6
 
 
+# u32 frame length, u16 fragment type with the compression flag in the top bit
+_FRAME_HEADER = struct.Struct(">IH")
+_FRAGMENT_TYPES = frozenset(t.value for t in FragmentType if t is not FragmentType.NONE)
+# service uid, stub id, method id, also the header of CALL fragments
+_NOTIFY_HEADER = struct.Struct(">QII")
+# stub id of the answered CALL
+_RETURN_HEADER = struct.Struct(">I")
+_CALL = FragmentType.CALL.value
+_NOTIFY = FragmentType.NOTIFY.value
+_RETURN = FragmentType.RETURN.value
+_ECHO = FragmentType.ECHO.value
+_FRAME_UP = FragmentType.FRAME_UP.value
+_FRAME_DOWN = FragmentType.FRAME_DOWN.value
+# largest frame considered sane, far above any observed FRAME_DOWN bundle
+MAX_FRAME_LENGTH = 1 << 22
+# byte-level shape of a plausible header: length up to MAX_FRAME_LENGTH, then
+# 0x00 or 0x80 and a known fragment type
+_FRAME_HEADER_CANDIDATE = re.compile(rb"\x00[\x00-\x40]..[\x00\x80][\x01-\x06]", re.DOTALL)
+
+
+def is_frame_header(data: bytes | memoryview, offset: int = 0) -> bool:
+    """Whether ``data`` holds a plausible BPSR frame header at ``offset``.
+
+    A plausible header has a length covering at least the header itself and no
+    more than ``MAX_FRAME_LENGTH``, and a known ``FragmentType`` other than
+    ``NONE`` once the compression flag is masked off.
+    """
+    if len(data) - offset < _FRAME_HEADER.size:
+        return False
+    length, frag_type = _FRAME_HEADER.unpack_from(data, offset)
+    return _FRAME_HEADER.size <= length <= MAX_FRAME_LENGTH and frag_type & 0x7FFF in _FRAGMENT_TYPES
+
+
+def find_frame_header(data: bytes | memoryview, start: int = 0, end: int | None = None) -> int:
+    """Offset of the first plausible frame header in ``data[start:end]``, or -1.
+
+    When the frame a candidate announces ends within ``data[:end]``, the next
+    frame header must be plausible too, which rules out most false positives
+    inside payloads.
+    """
+    end = len(data) if end is None else end
+    while (match := _FRAME_HEADER_CANDIDATE.search(data, start, end)) is not None:
+        offset = match.start()
+        if is_frame_header(data, offset):
+            following = offset + _FRAME_HEADER.unpack_from(data, offset)[0]
+            if following + _FRAME_HEADER.size > end or is_frame_header(data, following):
+                return offset
+        start = offset + 1
+    return -1
+
+
+# largest decompressed payload accepted, guards against decompression bombs
+MAX_DECOMPRESSED_SIZE = 1 << 24
+# initial and largest retained size of the per-thread decompression scratch buffer
+_SCRATCH_SIZE = 1 << 16
+_SCRATCH_LIMIT = 1 << 21
+
+
+class _Decompression(threading.local):
+    """Per-thread zstd context and scratch buffer, reused across frames."""
+
+    def __init__(self) -> None:
+        self.context = zstd.ZstdDecompressor()
+        self.buffer = bytearray(_SCRATCH_SIZE)
+
+
+_decompression = _Decompression()
+
+
+def decompress(data: bytes | memoryview, max_size: int = MAX_DECOMPRESSED_SIZE) -> bytes:
+    """Decompress a zstd frame with this thread's pooled context.
+
+    Frames declaring their content size are decompressed in one go. Others
+    are streamed into a reusable scratch buffer, grown as needed, instead of
+    failing or allocating blindly.
+
+    Raises:
+        ValueError: If the output would exceed ``max_size``.
+        zstd.ZstdError: If ``data`` is not valid zstd.
+    """
+    state = _decompression
+    size = zstd.frame_content_size(data)
+    if size > max_size:
+        raise ValueError(f"zstd frame declares {size} bytes, more than {max_size}")
+    if size >= 0:
+        return state.context.decompress(data)
+
+    view = memoryview(state.buffer)
+    written = 0
+    try:
+        with state.context.stream_reader(data) as reader:
+            while read := reader.readinto(view[written:]):
+                written += read
+                if written > max_size:
+                    raise ValueError(f"zstd frame decompresses to more than {max_size} bytes")
+                if written == len(view):
+                    # double, but to one byte past the limit at most, enough to detect it
+                    state.buffer = bytearray(min(2 * written, max_size + 1))
+                    state.buffer[:written] = view
+                    view = memoryview(state.buffer)
+        return bytes(view[:written])
+    finally:
+        if len(state.buffer) > _SCRATCH_LIMIT:
+            # don't keep the room an exceptionally large frame needed
+            state.buffer = bytearray(_SCRATCH_SIZE)
+
+
 @dataclass(slots=True, frozen=True)
 class NotifyFrame:
     """Decoded Notify frame contents.
@@ -37,9 +149,13 @@ class NotifyFrame:
         service_uid: Unique identifier for the service (typically 0x63335342).
         stub_id: Stub identifier for the RPC call.
         method_id: Method identifier indicating the type of message.
-        payload: Raw binary payload data (may be decompressed).
-        was_compressed: Whether the payload was decompressed from zstd.
-        offset: Byte offset where this frame was found in the original data.
+        raw_payload: Payload as received, still compressed if
+            ``was_compressed``. May be a view into the reassembly buffer, only
+            valid until the flow receives its next segment; ``bytes()`` it to
+            keep it longer.
+        was_compressed: Whether the payload is compressed with zstd.
+        max_decompressed_size: Largest decompressed payload accepted.
+        payload: Decompressed payload, decompressed on first access.
 
     Example:
         >>> frame = NotifyFrame(0x63335342, 123, 0x2E, b'data', False)
@@ -50,112 +166,272 @@ class NotifyFrame:
     service_uid: int
     stub_id: int
     method_id: int
-    payload: bytes
+    raw_payload: bytes | memoryview
     was_compressed: bool
+    max_decompressed_size: int = MAX_DECOMPRESSED_SIZE
+    _payload: bytes | memoryview | None = field(default=None, repr=False, compare=False)
+
+    @property
+    def payload(self) -> bytes | memoryview:
+        """
+        Raises:
+            ValueError: If the payload decompresses to more than ``max_decompressed_size``.
+            zstd.ZstdError: If the payload is not valid zstd.
+        """
+        if self._payload is None:
+            payload = self.raw_payload
+            if self.was_compressed and zstd:
+                payload = decompress(payload, self.max_decompressed_size)
+            object.__setattr__(self, "_payload", payload)
+        return self._payload
+
+
+def opcode(service_uid: int, method_id: int) -> int:
+    """Pack a 64-bit service uid and a 32-bit method id into a single 96-bit opcode."""
+    return (service_uid << 32) | method_id
+
+
+@dataclass(slots=True, frozen=True)
+class Decoder:
+    """What a notify method decodes to, and who receives it.
+
+    Attributes:
+        message_type: Protobuf message class of the payload.
+        handler: Called with every decoded message of this method, if set,
+            instead of the caller's default handler.
+        accept: Cheap check of the decompressed payload before it is parsed,
+            e.g. a field read with ``wire.find_varint``; rejected payloads
+            are dropped without being parsed.
+    """
+
+    message_type: type[Message]
+    handler: Callable[[Message], None] | None = None
+    accept: Callable[[bytes | memoryview], bool] | None = None
+
+
+class DecoderRegistry:
+    """Decoders of notify methods, keyed by packed ``opcode``.
+
+    Lookups are a single access to the flat ``table`` dict, so the decode
+    path never needs an exception to tell a method is unknown. Methods of
+    the generated opcode table are registered ``lazy``, their module is only
+    imported when a frame of one of them is first decoded.
+    """
+
+    def __init__(self) -> None:
+        self.table: dict[int, Decoder] = {}
+        self.lazy: dict[int, tuple[str, str]] = {}
+
+    def register(
+            self,
+            service_uid: int,
+            method_id: int,
+            message_type: type[Message],
+            handler: Callable[[Message], None] | None = None,
+            accept: Callable[[bytes | memoryview], bool] | None = None
+    ) -> None:
+        """Register or replace the decoder of a method, see ``Decoder``."""
+        code = opcode(service_uid, method_id)
+        self.lazy.pop(code, None)
+        self.table[code] = Decoder(message_type, handler, accept)
+
+    def register_lazy(self, table: Mapping[int, tuple[str, str]]) -> None:
+        """Register methods by opcode as ``(module, message)`` names, e.g. ``proto.opcodes.OPCODES``.
+
+        Args:
+            table: Module of ``star_resonance_relay.proto`` and dotted name
+                of the message class in it, by packed ``opcode``.
+        """
+        for code, name in table.items():
+            self.table.pop(code, None)
+            self.lazy[code] = name
+
+    def resolve(self, code: int) -> Decoder | None:
+        """Import the message class of a lazily registered opcode, None for unknown opcodes."""
+        name = self.lazy.pop(code, None)
+        if name is None:
+            return None
+        module, qualname = name
+        try:
+            message_type = importlib.import_module(f"star_resonance_relay.proto.{module}")
+            for attr in qualname.split("."):
+                message_type = getattr(message_type, attr)
+        except (ImportError, AttributeError) as exc:
+            logger.warning(f"Cannot decode {module}.{qualname}: {exc}")
+            return None
+        decoder = self.table[code] = Decoder(message_type)
+        return decoder
+
+    def get(self, service_uid: int, method_id: int) -> Decoder | None:
+        code = opcode(service_uid, method_id)
+        return self.table.get(code) or self.resolve(code)
+
+    def methods(self) -> Iterator[tuple[int, int]]:
+        """``(service_uid, method_id)`` pairs of every registered method."""
+        for code in (*self.table, *self.lazy):
+            yield code >> 32, code & 0xFFFFFFFF
+
+
+WORLD_NTF = 0x0000000063335342
+CHIT_CHAT_NTF = 0x0000000009d4a768
+
+# decoders used by processors unless given their own registry
+registry = DecoderRegistry()
+registry.register_lazy(OPCODES)
 
 
 class BPSRPacketProcessor:
     """Process assembled BPSR frames into method opcodes and payloads.
     """
 
-    def __init__(self) -> None:
-        # optional mapping of opcodes to protobuf decoders
-        self.proto_map: dict[int, dict[int, type[Message]]] = {
-            0x0000000063335342: {
-                0x00000006: WorldNtf.SyncNearEntities,
-                0x00000015: WorldNtf.SyncContainerData,
-                0x00000016: WorldNtf.SyncContainerDirtyData,
-                0x0000002E: WorldNtf.SyncToMeDeltaInfo,
-                0x0000002D: WorldNtf.SyncNearDeltaInfo
-            },
-            0x0000000009d4a768: {
-                0x00000001: ChitChatNtf.NotifyNewestChitChatMsgs
-            }
-        }
-
-    @staticmethod
-    def _parse_notify(body: bytes, is_zstd: bool) -> NotifyFrame | None:
+    def __init__(
+            self,
+            max_depth: int = 8,
+            max_decompressed_size: int = MAX_DECOMPRESSED_SIZE,
+            subscriptions: Iterable[tuple[int, int]] | None = None,
+            decoders: DecoderRegistry | None = None,
+            rpc: RpcTracker | None = None
+    ) -> None:
+        """
+        Args:
+            max_depth: Deepest ``FRAME_DOWN`` nesting unpacked, guards against
+                hostile frames.
+            max_decompressed_size: Largest decompressed payload accepted.
+            subscriptions: ``(service_uid, method_id)`` pairs of the notify
+                frames to yield, all of them if None. Other frames are dropped
+                right after their header, before their payload is touched.
+            decoders: Registry of the methods to decode, the shared module
+                level ``registry`` by default.
+            rpc: Pairs CALL fragments with their RETURN to time them, if set.
+                CALL, RETURN and ECHO fragments are skipped otherwise.
+        """
+        self.max_depth = max_depth
+        self.max_decompressed_size = max_decompressed_size
+        self._subscriptions: dict[int, set[int]] | None = None
+        for service_uid, method_id in subscriptions or ():
+            self.subscribe(service_uid, method_id)
+        self.decoders = registry if decoders is None else decoders
+        self.rpc = rpc
+
+    def subscribe(self, service_uid: int, method_id: int) -> None:
+        """Yield notify frames of this method, and only of subscribed methods from now on."""
+        if self._subscriptions is None:
+            self._subscriptions = {}
+        self._subscriptions.setdefault(service_uid, set()).add(method_id)
+
+    @property
+    def subscriptions(self) -> list[tuple[int, int]] | None:
+        """``(service_uid, method_id)`` pairs subscribed to, None while every method is yielded."""
+        if self._subscriptions is None:
+            return None
+        return [(service_uid, method_id) for service_uid, methods in self._subscriptions.items() for method_id in methods]
+
+    def subscribe_decodable(self) -> None:
+        """Subscribe to every method ``decode_payload`` has a decoder for."""
+        for service_uid, method_id in self.decoders.methods():
+            self.subscribe(service_uid, method_id)
+
+    def _parse_notify(self, body: bytes | memoryview, is_zstd: bool) -> NotifyFrame | None:
         """Parse a Notify frame body into a NotifyFrame object.
 
         Extracts the service UID, stub ID, method ID, and payload from a
-        Notify frame body. Handles decompression if the frame was marked
-        as compressed.
+        Notify frame body. Decompression is left to the first access of
+        ``NotifyFrame.payload``.
 
         Args:
             body: Raw frame body data.
             is_zstd: Whether the payload is compressed with zstd.
 
         Returns:
-            NotifyFrame | None: Parsed frame object, or None if parsing fails.
+            NotifyFrame | None: Parsed frame object, or None if parsing fails
+            or the method is not subscribed to.
         """
         # Notify frames must have at least 16 bytes (service_uid + stub_id + method_id)
         if len(body) < 16:
             return None
 
         # Extract header fields (all big-endian)
-        reader = BinaryReader(body)
-
-        service_uid = reader.read_u64()
-        stub_id = reader.read_u32()
-        method_id = reader.read_u32()
-        payload = reader.read_remaining()
-
-        # Decompress payload if needed
-        if is_zstd and zstd:
-            payload = zstd.decompress(payload)
+        service_uid, stub_id, method_id = _NOTIFY_HEADER.unpack_from(body)
+        if self._subscriptions is not None:
+            methods = self._subscriptions.get(service_uid)
+            if methods is None or method_id not in methods:
+                return None
 
         return NotifyFrame(
             service_uid=service_uid,
             stub_id=stub_id,
             method_id=method_id,
-            payload=payload,
-            was_compressed=is_zstd
+            raw_payload=body[_NOTIFY_HEADER.size:],
+            was_compressed=is_zstd,
+            max_decompressed_size=self.max_decompressed_size
         )
 
-    def process_frame(self, frame: bytes) -> Iterator[NotifyFrame]:
-        """Yield NotifyFrame from a single BPSR frame."""
-        reader = BinaryReader(frame)
-        while reader.remaining() > 0:
-            try:
-                pkt_len = reader.peek_u32()
-            except EOFError:
-                break
-            if pkt_len < 6 or reader.remaining() < pkt_len:
-                # malformed or incomplete
-                break
-
-            fragment = BinaryReader(reader.read(pkt_len))
-
-            # skip length field
-            fragment.read_u32()
-            frag_type_field = fragment.read_u16()
-
-            is_compressed = bool(frag_type_field & 0x8000)
-            try:
-                frag_type = FragmentType(frag_type_field & 0x7FFF)
-            except ValueError:
-                continue
+    def _track_rpc(self, frag_type: int, body: bytes | memoryview, now: float | None) -> None:
+        """Hand a CALL, RETURN or ECHO fragment to ``rpc``.
 
-            match frag_type:
-                case FragmentType.NOTIFY:
-                    yield self._parse_notify(fragment.read_remaining(), is_compressed)
-                case FragmentType.FRAME_DOWN:
-                    # nested frame; read server sequence id and recurse
-                    _server_seq = fragment.read_u32()
-                    nested = fragment.read_remaining()
+        CALL fragments start with the same header as Notify ones, RETURN
+        fragments with the stub id of their CALL. Payloads are not decoded.
+        """
+        if frag_type == _CALL:
+            if len(body) >= _NOTIFY_HEADER.size:
+                service_uid, stub_id, method_id = _NOTIFY_HEADER.unpack_from(body)
+                self.rpc.call(service_uid, stub_id, method_id, now)
+        elif frag_type == _RETURN:
+            if len(body) >= _RETURN_HEADER.size:
+                self.rpc.reply(_RETURN_HEADER.unpack_from(body)[0], now)
+        else:
+            self.rpc.echo()
+
+    def process_frame(self, frame: bytes | memoryview, now: float | None = None) -> Iterator[NotifyFrame]:
+        """Yield NotifyFrame from a single BPSR frame.
+
+        Nested ``FRAME_DOWN`` and ``FRAME_UP`` fragments are unpacked with an
+        explicit stack instead of recursion, so every frame is yielded straight
+        from here in stream order, and nesting deeper than ``max_depth`` is
+        skipped. With an ``rpc`` tracker, CALL and RETURN fragments are timed
+        as seen at ``now``, the current time by default. ``FRAME_UP`` bundles
+        only carry client CALLs, so they are left packed without one.
+        """
+        # (buffer, offset of the next fragment, nesting depth)
+        stack: list[tuple[memoryview, int, int]] = [(memoryview(frame), 0, 0)]
+        while stack:
+            data, offset, depth = stack.pop()
+            end = len(data)
+            while end - offset >= _FRAME_HEADER.size:
+                pkt_len, frag_type_field = _FRAME_HEADER.unpack_from(data, offset)
+                if pkt_len < _FRAME_HEADER.size or end - offset < pkt_len:
+                    # malformed or incomplete
+                    break
+                body = data[offset + _FRAME_HEADER.size:offset + pkt_len]
+                offset += pkt_len
+
+                is_compressed = bool(frag_type_field & 0x8000)
+                frag_type = frag_type_field & 0x7FFF
+                if frag_type == _NOTIFY:
+                    if (notify := self._parse_notify(body, is_compressed)) is not None:
+                        yield notify
+                elif frag_type == _FRAME_DOWN or (frag_type == _FRAME_UP and self.rpc is not None):
+                    if depth >= self.max_depth:
+                        logger.debug("Skipping FRAME_DOWN nested deeper than %d", self.max_depth)
+                        continue
+                    # nested frame behind the sequence id
+                    if len(body) < 4:
+                        continue
+                    nested = body[4:]
                     if is_compressed and zstd:
                         try:
-                            nested = zstd.decompress(nested)
-                        except Exception:
+                            nested = decompress(nested, self.max_decompressed_size)
+                        except (ValueError, zstd.ZstdError) as exc:
+                            logger.debug("Dropping FRAME_DOWN: %s", exc)
                             continue
-                    # Recursively process nested frames
-                    for tup in self.process_frame(nested):
-                        yield tup
-                case _:
-                    # other fragment types are ignored for now
-                    pass
-
-    def process_bytes(self, data: bytes) -> Iterator[NotifyFrame]:
+                    # finish this level once the nested frames are done
+                    stack.append((data, offset, depth))
+                    stack.append((memoryview(nested), 0, depth + 1))
+                    break
+                elif self.rpc is not None and (frag_type == _CALL or frag_type == _RETURN or frag_type == _ECHO):
+                    self._track_rpc(frag_type, body, now)
+
+    def process_bytes(self, data: bytes | memoryview) -> Iterator[NotifyFrame]:
         """Process one or more concatenated BPSR frames from a byte string."""
         frames = []
         reader = BinaryReader(data)
@@ -170,20 +446,115 @@ class BPSRPacketProcessor:
         for frame in frames:
             yield from self.process_frame(frame)
 
-    def decode_payload(self, frame: NotifyFrame) -> Message:
+    def decode_payload(self, frame: NotifyFrame, decoder: Decoder | None = None) -> Message | None:
         """Decode a raw payload into a protobuf message if possible.
-        """
-        method_map = self.proto_map.get(frame.service_uid)
-        if method_map is None:
-            raise NotImplementedError
 
-        decoder = method_map.get(frame.method_id)
+        Returns None for methods without a registered decoder, for payloads
+        its ``accept`` check rejects and for payloads that fail to decompress
+        or parse.
+        """
         if decoder is None:
-            raise NotImplementedError
+            decoder = self.decoders.get(frame.service_uid, frame.method_id)
+            if decoder is None:
+                return None
 
         try:
-            # All compiled protobuf messages support ``FromString``
-            return decoder.FromString(frame.payload)  # type: ignore[attr-defined]
+            payload = frame.payload
+        except (ValueError, zstd.ZstdError) as exc:
+            logger.debug("Dropping %s: %s", frame, exc)
+            return None
+        if decoder.accept is not None and not decoder.accept(payload):
+            return None
+
+        try:
+            # All compiled protobuf messages support ``FromString``, bytes are
+            # only materialised here (a no-op for decompressed payloads)
+            return decoder.message_type.FromString(bytes(payload))  # type: ignore[attr-defined]
         except Exception as exc:  # pragma: no cover
             logger.warning("Failed to decode %s: %s", frame, exc)
-            raise
+            return None
+
+    def _decode_groups(self, frames: Iterable[NotifyFrame]) -> Iterator[tuple[int, Decoder, list[Message]]]:
+        """Decode frames grouped by opcode, yielding ``(opcode, decoder, messages)`` per method."""
+        groups: dict[int, list[NotifyFrame]] = {}
+        for frame in frames:
+            code = opcode(frame.service_uid, frame.method_id)
+            group = groups.get(code)
+            if group is None:
+                groups[code] = [frame]
+            else:
+                group.append(frame)
+
+        table = self.decoders.table
+        for code, group in groups.items():
+            decoder = table.get(code) or self.decoders.resolve(code)
+            if decoder is None:
+                continue
+
+            payloads: list[bytes | memoryview] = []
+            for frame in group:
+                try:
+                    payloads.append(frame.payload)
+                except (ValueError, zstd.ZstdError) as exc:
+                    logger.debug("Dropping %s: %s", frame, exc)
+            if decoder.accept is not None:
+                payloads = list(filter(decoder.accept, payloads))
+
+            from_string = decoder.message_type.FromString  # type: ignore[attr-defined]
+            try:
+                messages = [from_string(bytes(payload)) for payload in payloads]
+            except Exception:  # pragma: no cover
+                # find the broken payloads one by one, only once the group failed
+                messages = []
+                for payload in payloads:
+                    try:
+                        messages.append(from_string(bytes(payload)))
+                    except Exception as exc:
+                        logger.warning(f"Failed to decode {decoder.message_type.__name__}: {exc}")
+            yield code, decoder, messages
+
+    def decode_batch(self, frames: Iterable[NotifyFrame]) -> list[tuple[int, Message]]:
+        """Decode many frames at once, grouped by method.
+
+        Each method's decoder is looked up once per batch and its frames are
+        parsed in one loop, which amortises the per-frame dispatch of
+        ``decode_payload`` over bundles of hundreds of notifies. Frames that
+        ``decode_payload`` would return None for are left out.
+
+        Returns:
+            ``(opcode, message)`` pairs, in stream order within a method but
+            grouped by method in the order each was first seen.
+        """
+        return [(code, message) for code, _, messages in self._decode_groups(frames) for message in messages]
+
+    def dispatch_batch(
+            self,
+            frames: Iterable[NotifyFrame],
+            default: Callable[[list[tuple[int, Message]]], None]
+    ) -> None:
+        """Decode a batch of frames, see ``decode_batch``.
+
+        Messages of methods with their own handler go to that handler one by
+        one, the rest are handed to ``default`` as a single list of
+        ``(opcode, message)`` pairs, if there are any.
+        """
+        batch: list[tuple[int, Message]] = []
+        for code, decoder, messages in self._decode_groups(frames):
+            if decoder.handler is not None:
+                for message in messages:
+                    decoder.handler(message)
+            else:
+                batch.extend(zip(repeat(code), messages))
+        if batch:
+            default(batch)
+
+    def dispatch(self, frame: NotifyFrame, default: Callable[[Message], None]) -> Message | None:
+        """Decode a frame and hand the message to the handler of its method, or to ``default``."""
+        code = opcode(frame.service_uid, frame.method_id)
+        decoder = self.decoders.table.get(code) or self.decoders.resolve(code)
+        if decoder is None:
+            return None
+        message = self.decode_payload(frame, decoder)
+        if message is not None:
+            (decoder.handler or default)(message)
+        return message
@@ -0,0 +1,366 @@
+import logging
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import BinaryIO, Iterator, Callable
+
+from google.protobuf.message import Message
+
+from star_resonance_relay.net import parse_link
+from star_resonance_relay.processor import BPSRPacketProcessor, find_frame_header
+from star_resonance_relay.utils import SegmentStore, seq_diff
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 1 << 22
+
+PCAP_MAGIC_USEC = 0xA1B2C3D4
+PCAP_MAGIC_NSEC = 0xA1B23C4D
+PCAPNG_SECTION_HEADER = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+PCAPNG_INTERFACE_DESCRIPTION = 0x00000001
+PCAPNG_OBSOLETE_PACKET = 0x00000002
+PCAPNG_SIMPLE_PACKET = 0x00000003
+PCAPNG_ENHANCED_PACKET = 0x00000006
+PCAPNG_OPTION_END = 0
+PCAPNG_OPTION_IF_TSRESOL = 9
+
+
+class _ChunkedReader:
+    """Read a file in large blocks and hand out views into the current block.
+
+    Views returned by ``take`` are only valid until the next call to ``fill``,
+    which compacts the unread tail to the front of the buffer before reading
+    the next block behind it.
+    """
+
+    def __init__(self, file: BinaryIO, block_size: int):
+        self._file = file
+        self._buffer = bytearray(block_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+    def fill(self, size: int) -> bool:
+        """Make at least ``size`` bytes available, False on end of file."""
+        available = self._end - self._start
+        if available >= size:
+            return True
+
+        if size > len(self._buffer):
+            buffer = bytearray(max(size, 2 * len(self._buffer)))
+            buffer[:available] = self._view[self._start:self._end]
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+        else:
+            self._view[:available] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = available
+
+        while self._end < size:
+            read = self._file.readinto(self._view[self._end:])
+            if not read:
+                return False
+            self._end += read
+        return True
+
+    def peek(self, size: int) -> memoryview:
+        return self._view[self._start:self._start + size]
+
+    def take(self, size: int) -> memoryview:
+        view = self._view[self._start:self._start + size]
+        self._start += size
+        return view
+
+
+def _read_pcap(reader: _ChunkedReader) -> Iterator[tuple[float, int, memoryview]]:
+    if not reader.fill(24):
+        return
+    magic = struct.unpack("<I", reader.peek(4))[0]
+    endian = "<" if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC) else ">"
+    magic, _major, _minor, _zone, _sigfigs, _snaplen, linktype = struct.unpack(endian + "IHHiIII", reader.take(24))
+    if magic not in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+        raise ValueError(f"not a pcap file (magic 0x{magic:08x})")
+    resolution = 1e-9 if magic == PCAP_MAGIC_NSEC else 1e-6
+
+    record = struct.Struct(endian + "IIII")
+    while reader.fill(record.size):
+        ts_sec, ts_frac, captured, _original = record.unpack(reader.take(record.size))
+        if not reader.fill(captured):
+            logger.warning("Truncated pcap record at end of file")
+            return
+        yield ts_sec + ts_frac * resolution, linktype, reader.take(captured)
+
+
+def _if_tsresol(options: memoryview, endian: str) -> float:
+    offset = 0
+    while offset + 4 <= len(options):
+        code, length = struct.unpack_from(endian + "HH", options, offset)
+        offset += 4
+        if code == PCAPNG_OPTION_END:
+            break
+        if code == PCAPNG_OPTION_IF_TSRESOL and length >= 1:
+            value = options[offset]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        offset += (length + 3) & ~3
+    return 1e-6
+
+
+def _read_pcapng(reader: _ChunkedReader) -> Iterator[tuple[float, int, memoryview]]:
+    endian = "<"
+    # (linktype, timestamp resolution) per interface id of the current section
+    interfaces: list[tuple[int, float]] = []
+
+    while reader.fill(12):
+        block_type = struct.unpack_from(endian + "I", reader.peek(4))[0]
+        if block_type == PCAPNG_SECTION_HEADER:
+            endian = "<" if struct.unpack_from("<I", reader.peek(12), 8)[0] == PCAPNG_BYTE_ORDER_MAGIC else ">"
+            interfaces = []
+
+        block_type, block_len = struct.unpack_from(endian + "II", reader.peek(8))
+        if block_len < 12 or not reader.fill(block_len):
+            logger.warning("Truncated pcapng block at end of file")
+            return
+        body = reader.take(block_len)[8:-4]
+
+        if block_type == PCAPNG_INTERFACE_DESCRIPTION:
+            linktype = struct.unpack_from(endian + "H", body)[0]
+            interfaces.append((linktype, _if_tsresol(body[8:], endian)))
+        elif block_type == PCAPNG_ENHANCED_PACKET:
+            interface, ts_high, ts_low, captured, _original = struct.unpack_from(endian + "IIIII", body)
+            linktype, resolution = interfaces[interface]
+            yield ((ts_high << 32) | ts_low) * resolution, linktype, body[20:20 + captured]
+        elif block_type == PCAPNG_SIMPLE_PACKET:
+            # always interface 0, no timestamp
+            original = struct.unpack_from(endian + "I", body)[0]
+            yield 0.0, interfaces[0][0], body[4:4 + min(original, len(body) - 4)]
+        elif block_type == PCAPNG_OBSOLETE_PACKET:
+            interface, _drops, ts_high, ts_low, captured, _original = struct.unpack_from(endian + "HHIIII", body)
+            linktype, resolution = interfaces[interface]
+            yield ((ts_high << 32) | ts_low) * resolution, linktype, body[20:20 + captured]
+
+
+def read_capture(file: BinaryIO, block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[tuple[float, int, memoryview]]:
+    """Stream ``(timestamp, linktype, frame)`` records from a pcap or pcapng file.
+
+    The file is read ``block_size`` bytes at a time instead of record by record,
+    and frames are yielded as views into the read buffer, so they must be
+    consumed before the iterator is advanced.
+    """
+    reader = _ChunkedReader(file, block_size)
+    if not reader.fill(4):
+        return
+    if struct.unpack("<I", reader.peek(4))[0] == PCAPNG_SECTION_HEADER:
+        yield from _read_pcapng(reader)
+    else:
+        yield from _read_pcap(reader)
+
+
+@dataclass(slots=True)
+class _Stream:
+    """Server -> client data of one flow, held whole for ``--index``.
+
+    In-order segments are appended to ``data``, only the ones received
+    past a missing segment are held in ``pending``.
+
+    Attributes:
+        next_seq: Sequence number following ``data``.
+        data: Contiguous data from the first segment on.
+        pending: Data received past a missing segment, at stream offsets.
+        end: Stream offset following the furthest byte received.
+    """
+
+    next_seq: int
+    data: bytearray = field(default_factory=bytearray)
+    pending: SegmentStore = field(default_factory=SegmentStore)
+    end: int = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.data) + self.pending.size
+
+    def _append(self, payload: bytes | memoryview) -> None:
+        self.data += payload
+        self.next_seq = (self.next_seq + len(payload)) & 0xFFFFFFFF
+
+    def push(self, seq: int, payload: memoryview) -> None:
+        position = len(self.data)
+        offset = position + seq_diff(seq, self.next_seq)
+        end = offset + len(payload)
+        self.end = max(self.end, end)
+        if end <= position:
+            # retransmitted, or from before the flow was picked up
+            return
+        if offset > position:
+            self.pending.insert(offset, payload)
+            return
+        self._append(payload[position - offset:])
+        for start, data in self.pending.pop_until(len(self.data)):
+            if start + len(data) > len(self.data):
+                self._append(memoryview(data)[len(self.data) - start:])
+
+    def runs(self) -> list[bytes | bytearray]:
+        """``data``, then every run of ``pending`` left behind a segment that was never captured."""
+        return [self.data, *(data for _, data in self.pending.pop_until(self.end))]
+
+
+def _replay_streams(
+        streams: dict[int, _Stream],
+        callback: Callable[[Message], None],
+        batch_callback: Callable[[list[tuple[int, Message]]], None] | None = None
+) -> None:
+    """Decode every contiguous run of each stream at once, with ``frame_index.process_buffer``.
+
+    A run ends at a segment that was never captured, the next run resumes at
+    its first frame header.
+    """
+    from star_resonance_relay.frame_index import process_buffer
+
+    # like the processors of live flows, so notifies nothing can decode are dropped from the index
+    processor = BPSRPacketProcessor()
+    processor.subscribe_decodable()
+    for stream in streams.values():
+        for data in stream.runs():
+            view = memoryview(data)
+            start = find_frame_header(view)
+            if start < 0:
+                continue
+            frames = process_buffer(processor, view[start:])
+            if batch_callback is not None:
+                processor.dispatch_batch(frames, batch_callback)
+            else:
+                for frame in frames:
+                    processor.dispatch(frame, callback)
+
+
+def main():
+    import argparse
+    from pathlib import Path
+    from discord.utils import setup_logging
+
+    from star_resonance_relay.signatures import SignatureMatcher
+    from star_resonance_relay.sniffer import PROFILES, SnifferGroup
+
+    parser = argparse.ArgumentParser(description="Replay a pcap/pcapng capture through the BPSR sniffer.")
+    parser.add_argument("capture", type=Path, help="pcap or pcapng file")
+    parser.add_argument("--profile", choices=PROFILES, action="append", dest="profiles",
+                        help="Sniffer profile to replay through, may be repeated (default: chat)")
+    parser.add_argument("--realtime", action="store_true", help="Pace the replay using the capture timestamps")
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback speed multiplier for --realtime")
+    parser.add_argument("--relay", action="store_true", help="Relay chat messages to WEBHOOK_URL, e.g. to backfill an outage")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE, help="Read size in bytes")
+    parser.add_argument("--rpc", action="store_true", help="Time CALLs against their RETURN, per method")
+    parser.add_argument("--batch", action="store_true",
+                        help="Decode the frames of each segment together, grouped by method")
+    parser.add_argument("--index", action="store_true",
+                        help="Reassemble each flow whole, then decode it with a NumPy frame index")
+    args = parser.parse_args()
+    if args.index:
+        from star_resonance_relay import frame_index
+        if frame_index.np is None:
+            parser.error("--index needs NumPy, install the replay extra")
+        if args.rpc:
+            parser.error("--rpc cannot be combined with --index, only server flows are reassembled")
+
+    setup_logging()
+
+    relay: Callable[[Message], None] | None = None
+    if args.relay:
+        from discord import Intents
+        from star_resonance_relay.bot import BPSRRelayBot
+
+        relay = BPSRRelayBot(command_prefix=".", intents=Intents.default(), capture=False).on_bpsr_message
+
+    messages: dict[str, int] = {}
+
+    def callback(message: Message) -> None:
+        name = message.DESCRIPTOR.full_name
+        messages[name] = messages.get(name, 0) + 1
+        if relay is not None:
+            relay(message)
+
+    def batch_callback(batch: list[tuple[int, Message]]) -> None:
+        for _, message in batch:
+            callback(message)
+
+    profiles = [PROFILES[profile] for profile in args.profiles or ["chat"]]
+    sniffer = SnifferGroup([
+        profile(callback, track_rpc=args.rpc, batch_callback=batch_callback if args.batch else None)
+        for profile in profiles
+    ])
+    # with --index, flows are picked up by the same signatures but only decoded once the capture is read
+    matcher = SignatureMatcher([profile.SIGNATURES for profile in profiles])
+    streams: dict[int, _Stream] = {}
+
+    packets = 0
+    size = 0
+    first_timestamp: float | None = None
+    started = time.perf_counter()
+    with args.capture.open("rb", buffering=0) as file:
+        for timestamp, linktype, frame in read_capture(file, args.block_size):
+            packets += 1
+            size += len(frame)
+
+            if args.realtime:
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                delay = (timestamp - first_timestamp) / args.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+
+            segment = parse_link(linktype, frame)
+            if segment is None:
+                continue
+            if args.index:
+                if not segment.payload:
+                    continue
+                stream = streams.get(segment.flow)
+                if stream is None:
+                    if matcher.match(segment.payload) is None:
+                        continue
+                    stream = streams[segment.flow] = _Stream(segment.seq)
+                stream.push(segment.seq, segment.payload)
+            else:
+                # timeouts and round trips run on capture time, however fast the replay
+                segment.timestamp = timestamp
+                sniffer.handle_segment(segment)
+    indexed = sum(stream.size for stream in streams.values())
+    if args.index:
+        _replay_streams(streams, callback, batch_callback if args.batch else None)
+    elapsed = time.perf_counter() - started
+
+    logger.info(
+        f"Replayed {packets} packets ({size / 1e6:.1f} MB) in {elapsed:.2f}s, "
+        f"{packets / elapsed if elapsed else 0:.0f} packets/s"
+    )
+    if args.index:
+        logger.info(f"Indexed {len(streams)} flows ({indexed / 1e6:.1f} MB)")
+    else:
+        stats = sniffer.reassembly_stats()
+        logger.info(
+            f"Reassembled {stats.frames} frames, {stats.spanning_frames} of them split across segments, "
+            f"{stats.duplicate_bytes} retransmitted bytes dropped"
+        )
+        if stats.resyncs:
+            logger.info(
+                f"Resynchronised {stats.resyncs} times, {stats.lost_bytes} bytes lost, "
+                f"{stats.skipped_bytes} bytes skipped"
+            )
+        if stats.evicted_bytes:
+            logger.info(f"Evicted {stats.evicted_bytes} bytes to stay within the reassembly budget")
+        logger.info(f"Still holding {sniffer.held_bytes} reassembly bytes")
+    for name, count in sorted(messages.items()):
+        logger.info(f"  {name}: {count}")
+    if args.rpc:
+        rpc = sniffer.rpc_latencies()
+        logger.info(
+            f"Paired {rpc.stats.returns} of {rpc.stats.calls} calls, {rpc.stats.unmatched} returns unmatched, "
+            f"{rpc.stats.timeouts} calls timed out, {rpc.stats.echoes} echoes"
+        )
+        for line in rpc.summary():
+            logger.info(f"  {line}")
+
+
+if __name__ == '__main__':
+    main()
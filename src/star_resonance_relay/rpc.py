@@ -0,0 +1,157 @@
+import bisect
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Iterator, Self
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the latency buckets in seconds, the last bucket takes everything slower
+LATENCY_BOUNDS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+
+@dataclass(slots=True)
+class LatencyHistogram:
+    """Round trip times of one method, bucketed by ``LATENCY_BOUNDS``.
+
+    Attributes:
+        buckets: Calls answered within each bound, plus one for the slower ones.
+        total: Sum of every round trip time, in seconds.
+    """
+
+    buckets: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BOUNDS) + 1))
+    total: float = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self.buckets)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def record(self, latency: float) -> None:
+        self.buckets[bisect.bisect_left(LATENCY_BOUNDS, latency)] += 1
+        self.total += latency
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile, inf if it is the slowest one."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BOUNDS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def add(self, other: Self) -> None:
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.total += other.total
+
+
+@dataclass(slots=True)
+class RpcStats:
+    """Counters kept by ``RpcTracker``.
+
+    Attributes:
+        calls: CALL fragments seen.
+        returns: RETURN fragments paired with their CALL.
+        unmatched: RETURN fragments without a CALL in flight, e.g. sent before
+            the flow was locked or after their CALL timed out.
+        timeouts: Calls given up after ``RpcTracker.timeout`` without a RETURN.
+        evicted: Calls dropped to stay within ``RpcTracker.max_in_flight``.
+        echoes: ECHO fragments seen.
+    """
+
+    calls: int = 0
+    returns: int = 0
+    unmatched: int = 0
+    timeouts: int = 0
+    evicted: int = 0
+    echoes: int = 0
+
+    def add(self, other: Self) -> None:
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+class RpcTracker:
+    """Pair the CALLs of one connection with their RETURNs by stub id, and time them.
+
+    Calls in flight are kept in sending order, so the stale ones are always
+    at the front and expire without a scan.
+    """
+
+    def __init__(self, max_in_flight: int = 4096, timeout: float = 30.0):
+        """
+        Args:
+            max_in_flight: Calls awaiting their RETURN that are kept, the
+                oldest is dropped to make room for a new one.
+            timeout: Seconds after which a call without a RETURN is given up.
+        """
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        # stub id -> (service uid, method id, time sent)
+        self.in_flight: OrderedDict[int, tuple[int, int, float]] = OrderedDict()
+        # by (service uid, method id)
+        self.latencies: dict[tuple[int, int], LatencyHistogram] = {}
+        self.stats = RpcStats()
+
+    def call(self, service_uid: int, stub_id: int, method_id: int, now: float | None = None) -> None:
+        now = time.monotonic() if now is None else now
+        self.stats.calls += 1
+        self.expire(now)
+        if stub_id in self.in_flight:
+            # stub id reused before its RETURN, only the latest call can still be answered
+            del self.in_flight[stub_id]
+        elif len(self.in_flight) >= self.max_in_flight:
+            self.in_flight.popitem(last=False)
+            self.stats.evicted += 1
+        self.in_flight[stub_id] = (service_uid, method_id, now)
+
+    def reply(self, stub_id: int, now: float | None = None) -> float | None:
+        """Pair a RETURN with its CALL, returns the round trip time or None if there was no CALL."""
+        now = time.monotonic() if now is None else now
+        call = self.in_flight.pop(stub_id, None)
+        if call is None:
+            self.stats.unmatched += 1
+            return None
+        service_uid, method_id, sent = call
+        latency = max(now - sent, 0.0)
+        histogram = self.latencies.get((service_uid, method_id))
+        if histogram is None:
+            histogram = self.latencies[(service_uid, method_id)] = LatencyHistogram()
+        histogram.record(latency)
+        self.stats.returns += 1
+        return latency
+
+    def echo(self) -> None:
+        self.stats.echoes += 1
+
+    def expire(self, now: float | None = None) -> None:
+        """Give up every call sent more than ``timeout`` seconds ago."""
+        now = time.monotonic() if now is None else now
+        while self.in_flight:
+            stub_id, (_, _, sent) = next(iter(self.in_flight.items()))
+            if now - sent <= self.timeout:
+                break
+            del self.in_flight[stub_id]
+            self.stats.timeouts += 1
+
+    def add(self, other: Self) -> None:
+        """Merge the latencies and counters of ``other``, e.g. of a released flow."""
+        self.stats.add(other.stats)
+        for method, histogram in other.latencies.items():
+            self.latencies.setdefault(method, LatencyHistogram()).add(histogram)
+
+    def summary(self) -> Iterator[str]:
+        """One line per method, slowest mean first."""
+        for (service_uid, method_id), histogram in sorted(
+                self.latencies.items(), key=lambda item: item[1].mean, reverse=True
+        ):
+            yield (
+                f"0x{service_uid:08x}/0x{method_id:08x}: {histogram.count} calls, "
+                f"mean {histogram.mean * 1000:.1f} ms, p50 <= {histogram.quantile(0.5) * 1000:.0f} ms, "
+                f"p99 <= {histogram.quantile(0.99) * 1000:.0f} ms"
+            )
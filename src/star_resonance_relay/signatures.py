@@ -0,0 +1,81 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Sequence, Self
+
+
+@dataclass(frozen=True, slots=True)
+class Signature:
+    """A byte pattern identifying the packets of a server.
+
+    Attributes:
+        pattern: Regular expression over bytes.
+        anchored: Whether the pattern only matches at the start of the payload.
+        verify: Optional structural check, called with the payload and the
+            offset the pattern matched at, for patterns too loose on their own.
+    """
+
+    pattern: bytes
+    anchored: bool = False
+    verify: Callable[[memoryview | bytes, int], bool] | None = None
+
+    @classmethod
+    def prefix(cls, signature: bytes) -> Self:
+        return cls(re.escape(signature), anchored=True)
+
+    @classmethod
+    def contains(cls, signature: bytes, verify: Callable[[memoryview | bytes, int], bool] | None = None) -> Self:
+        return cls(re.escape(signature), verify=verify)
+
+
+class SignatureMatcher:
+    """Match a payload against the signatures of several profiles in one pass.
+
+    Signatures are compiled into two alternations, one tried at the start of
+    the payload and one searched through it, so a payload that matches none of
+    them costs a single scan in C, on the payload as is. Only when something
+    matched are the individual signatures tried to tell which one it was.
+    The alternations use non-capturing groups, capturing ones would disable
+    the literal prefix scan of the regex engine.
+    """
+
+    def __init__(self, profiles: Sequence[Sequence[Signature]]):
+        self._anchored: list[tuple[int, Signature, re.Pattern]] = []
+        self._floating: list[tuple[int, Signature, re.Pattern]] = []
+        for index, signatures in enumerate(profiles):
+            for signature in signatures:
+                candidates = self._anchored if signature.anchored else self._floating
+                candidates.append((index, signature, re.compile(signature.pattern, re.DOTALL)))
+        self._anchored_any = self._compile(self._anchored)
+        self._floating_any = self._compile(self._floating)
+
+    @staticmethod
+    def _compile(candidates: list[tuple[int, Signature, re.Pattern]]) -> re.Pattern | None:
+        if not candidates:
+            return None
+        return re.compile(b"|".join(b"(?:" + signature.pattern + b")" for _, signature, _ in candidates), re.DOTALL)
+
+    @staticmethod
+    def _identify(
+            payload: memoryview | bytes,
+            start: int,
+            candidates: list[tuple[int, Signature, re.Pattern]]
+    ) -> int | None:
+        for index, signature, pattern in candidates:
+            if pattern.match(payload, start) is not None and (
+                    signature.verify is None or signature.verify(payload, start)):
+                return index
+        return None
+
+    def match(self, payload: memoryview | bytes) -> int | None:
+        """Return the index of the profile the payload belongs to, if any."""
+        if self._anchored_any is not None and self._anchored_any.match(payload) is not None:
+            if (index := self._identify(payload, 0, self._anchored)) is not None:
+                return index
+
+        pos = 0
+        while self._floating_any is not None and (match := self._floating_any.search(payload, pos)) is not None:
+            if (index := self._identify(payload, match.start(), self._floating)) is not None:
+                return index
+            # candidates may overlap a rejected one
+            pos = match.start() + 1
+        return None
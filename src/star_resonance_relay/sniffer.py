@@ -1,6 +1,11 @@
 import logging
-from dataclasses import dataclass
-from typing import Self, override, Callable
+import re
+import socket
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Self, Callable, ClassVar
 
 from google.protobuf.message import Message
 from scapy.layers.inet import TCP, IP
@@ -8,11 +13,33 @@ from scapy.packet import Packet, Raw
 from scapy.config import conf
 conf.layers.filter([TCP, IP])
 
-from star_resonance_relay.processor import BPSRPacketProcessor
-from star_resonance_relay.utils import TCPReassembler, BinaryReader
+from star_resonance_relay.net import TCPSegment, TCP_FIN, TCP_RST, TCP_SYN, flow_key, reverse_flow_key, unpack_flow_key, \
+    parse_ethernet
+from star_resonance_relay.processor import BPSRPacketProcessor, MAX_FRAME_LENGTH, NotifyFrame, find_frame_header, \
+    is_frame_header
+from star_resonance_relay.rpc import RpcTracker
+from star_resonance_relay.signatures import Signature, SignatureMatcher
+from star_resonance_relay.state import FlowLockCache
+from star_resonance_relay.utils import ReassemblyStats, TCPReassembler
 
 logger = logging.getLogger(__name__)
 
+_U32 = struct.Struct(">I")
+
+# bytes the reassembler of one flow may hold, room for two frames of the maximum length
+FLOW_REASSEMBLY_BUDGET = 2 * MAX_FRAME_LENGTH
+
+
+def _flow_reassembler() -> TCPReassembler:
+    return TCPReassembler(find_frame_header, max_frame_length=MAX_FRAME_LENGTH, max_held=FLOW_REASSEMBLY_BUDGET)
+
+
+def _flow_processor(rpc: RpcTracker | None = None) -> BPSRPacketProcessor:
+    # frames nothing can decode are dropped before their payload is decompressed
+    processor = BPSRPacketProcessor(rpc=rpc)
+    processor.subscribe_decodable()
+    return processor
+
 
 @dataclass(frozen=True, slots=True)
 class ServerPort:
@@ -32,101 +59,520 @@ class Endpoints:
             ServerPort(packet[IP].dst, packet[TCP].dport)
         )
 
+    @classmethod
+    def from_key(cls, key: int) -> Self:
+        src, sport, dst, dport = unpack_flow_key(key)
+        return cls(ServerPort(src, sport), ServerPort(dst, dport))
+
+    @property
+    def key(self) -> int:
+        return flow_key(
+            int.from_bytes(socket.inet_aton(self.source.ip)),
+            self.source.port,
+            int.from_bytes(socket.inet_aton(self.destination.ip)),
+            self.destination.port
+        )
+
+    def reversed(self) -> Self:
+        return type(self)(self.destination, self.source)
+
+    def as_tuple(self) -> tuple[str, int, str, int]:
+        return self.source.ip, self.source.port, self.destination.ip, self.destination.port
+
+
+def segment_from_packet(packet: Packet) -> TCPSegment:
+    """Convert a scapy dissected IPv4/TCP packet into a ``TCPSegment``."""
+    tcp = packet[TCP]
+    return TCPSegment(
+        Endpoints.from_packet(packet).key,
+        tcp.seq,
+        int(tcp.flags),
+        memoryview(bytes(packet[Raw]) if Raw in packet else b""),
+        float(packet.time)
+    )
+
+
+@dataclass(slots=True)
+class Flow:
+    """State kept for one locked server -> client flow."""
+
+    endpoints: Endpoints
+    processor: BPSRPacketProcessor = field(default_factory=_flow_processor)
+    reassembler: TCPReassembler = field(default_factory=_flow_reassembler)
+    last_seen: float = 0.0
+    # restored from the lock cache and not yet confirmed to carry BPSR frames
+    tentative: bool = False
+    # client -> server stream, only followed to time CALLs against their RETURN
+    client_reassembler: TCPReassembler | None = None
+
+    @property
+    def reassemblers(self) -> list[TCPReassembler]:
+        if self.client_reassembler is None:
+            return [self.reassembler]
+        return [self.reassembler, self.client_reassembler]
+
 
 class Sniffer:
-    def __init__(self, callback: Callable[[Message], None]):
+    # profile name, also used as the key in the flow lock cache
+    NAME: ClassVar[str] = ""
+    # how often idle flows are looked for, in seconds
+    SWEEP_INTERVAL = 30.0
+    # frames reassembled from a cached flow needed to confirm it, and resyncs on
+    # malformed lengths or bytes skipped looking for a header after which it is given up
+    CONFIRM_FRAMES = 3
+    REJECT_RESYNCS = 3
+    REJECT_SKIPPED_BYTES = 1 << 16
+    # seconds a cached flow may stay unconfirmed before it is given up
+    TENTATIVE_TIMEOUT = 60.0
+    # packets identifying the server flow, compiled into ``_matcher`` per subclass
+    SIGNATURES: ClassVar[tuple[Signature, ...]] = ()
+    _matcher: ClassVar[SignatureMatcher] = SignatureMatcher([])
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._matcher = SignatureMatcher([cls.SIGNATURES])
+
+    def __init__(
+            self,
+            callback: Callable[[Message], None],
+            on_lock: Callable[[list[Endpoints] | None], None] | None = None,
+            max_flows: int = 1,
+            idle_timeout: float = 300.0,
+            cache: FlowLockCache | None = None,
+            reassembly_budget: int = 1 << 26,
+            track_rpc: bool = False,
+            batch_callback: Callable[[list[tuple[int, Message]]], None] | None = None
+    ):
+        """
+        Args:
+            callback: Called with every decoded protobuf message of any locked flow.
+            on_lock: Called with the locked endpoints once ``max_flows`` flows are
+                locked, or with ``None`` while there is room for more. Used to
+                narrow the capture filter to the locked flows.
+            max_flows: Number of flows (game clients) tracked at the same time.
+                Locking another flow when full releases the least recently active one.
+            idle_timeout: Seconds without traffic after which a flow is released.
+            cache: Where locked flows are remembered across restarts. Cached
+                flows are locked tentatively on startup, until their traffic
+                confirms they still carry BPSR frames.
+            reassembly_budget: Bytes the reassemblers of all flows may hold
+                together, on top of the per-flow ``FLOW_REASSEMBLY_BUDGET``.
+            track_rpc: Also reassemble the client -> server stream of each flow,
+                to pair CALLs with their RETURN and time them, see ``rpc_latencies``.
+            batch_callback: Called instead of ``callback`` with the messages of
+                every segment at once, as ``(opcode, message)`` pairs grouped by
+                method, see ``BPSRPacketProcessor.decode_batch``.
+        """
         self._callback = callback
-        self._known_server: Endpoints | None = None
-        # self._reassembler = TCPReassembler()
-        self._processor = BPSRPacketProcessor()
+        self._batch_callback = batch_callback
+        self._on_lock = on_lock
+        self._max_flows = max_flows
+        self._idle_timeout = idle_timeout
+        self._reassembly_budget = reassembly_budget
+        self._track_rpc = track_rpc
+        self._flows: dict[int, Flow] = {}  # keyed by the server -> client flow key
+        self._next_sweep = 0.0
+        # segments and idle sweeps may come from different threads
+        self._mutex = threading.RLock()
+        self._cache = cache
+        self._released_stats = ReassemblyStats()  # of flows no longer locked
+        self._released_rpc = RpcTracker()
 
-    def _is_server(self, payload: bytes) -> bool:
-        raise NotImplementedError
+        if cache is not None:
+            now = time.time()
+            for cached in cache.load(self.NAME)[:max_flows]:
+                endpoints = Endpoints(ServerPort(cached[0], cached[1]), ServerPort(cached[2], cached[3]))
+                logger.info(f"Tentatively locking to cached flow {endpoints.source} <-> {endpoints.destination}")
+                self._flows[endpoints.key] = self._new_flow(endpoints, last_seen=now, tentative=True)
+
+    @property
+    def flows(self) -> list[Endpoints]:
+        """Endpoints of the locked flows, excluding unconfirmed cached ones."""
+        return [flow.endpoints for flow in self._flows.values() if not flow.tentative]
+
+    @property
+    def is_full(self) -> bool:
+        return len(self.flows) >= self._max_flows
+
+    @property
+    def held_bytes(self) -> int:
+        """Bytes currently held by the reassemblers of all flows."""
+        return sum(reassembler.held for flow in self._flows.values() for reassembler in flow.reassemblers)
+
+    def _enforce_budget(self) -> None:
+        held = self.held_bytes
+        if held <= self._reassembly_budget:
+            return
+        # the streams holding the most give up their oldest segments first
+        reassemblers = [reassembler for flow in self._flows.values() for reassembler in flow.reassemblers]
+        for reassembler in sorted(reassemblers, key=lambda r: r.held, reverse=True):
+            held -= reassembler.evict(held - self._reassembly_budget)
+            if held <= self._reassembly_budget:
+                break
+        logger.debug("Reassembly budget exceeded, now holding %d bytes", held)
+
+    def reassembly_stats(self) -> ReassemblyStats:
+        """Reassembly counters summed over every flow locked so far."""
+        stats = ReassemblyStats()
+        stats.add(self._released_stats)
+        for flow in self._flows.values():
+            for reassembler in flow.reassemblers:
+                stats.add(reassembler.stats)
+        return stats
+
+    def rpc_latencies(self) -> RpcTracker:
+        """Round trip times and counters of the CALLs of every flow locked so far, with ``track_rpc``."""
+        with self._mutex:
+            rpc = RpcTracker()
+            rpc.add(self._released_rpc)
+            for flow in self._flows.values():
+                if flow.processor.rpc is not None:
+                    rpc.add(flow.processor.rpc)
+            return rpc
+
+    def is_locked(self, key: int) -> bool:
+        return key in self._flows
+
+    def _is_server(self, payload: memoryview | bytes) -> bool:
+        return self._matcher.match(payload) is not None
+
+    def _notify_lock(self) -> None:
+        if self._on_lock is not None:
+            self._on_lock(self.flows if self.is_full else None)
+
+    def _save(self) -> None:
+        if self._cache is not None:
+            # unconfirmed cached flows stay cached until they are given up
+            self._cache.save(self.NAME, [flow.endpoints.as_tuple() for flow in self._flows.values()])
+
+    def _new_flow(self, endpoints: Endpoints, **kwargs) -> Flow:
+        if not self._track_rpc:
+            return Flow(endpoints, **kwargs)
+        return Flow(
+            endpoints,
+            processor=_flow_processor(RpcTracker()),
+            client_reassembler=_flow_reassembler(),
+            **kwargs
+        )
+
+    def _retire(self, flow: Flow) -> None:
+        """Keep the counters of a flow that is released or started over."""
+        for reassembler in flow.reassemblers:
+            self._released_stats.add(reassembler.stats)
+        if flow.processor.rpc is not None:
+            self._released_rpc.add(flow.processor.rpc)
+
+    def _lock(self, key: int) -> Flow:
+        if len(self._flows) >= self._max_flows:
+            # unconfirmed cached flows go first
+            oldest = min(self._flows.values(), key=lambda f: (not f.tentative, f.last_seen))
+            self._release(oldest.endpoints.key, "replaced")
+
+        flow = self._new_flow(Endpoints.from_key(key))
+        logger.info(f"Locking to flow {flow.endpoints.source} <-> {flow.endpoints.destination}")
+        self._flows[key] = flow
+        self._notify_lock()
+        self._save()
+        return flow
+
+    def _release(self, key: int, reason: str) -> None:
+        flow = self._flows.pop(key)
+        self._retire(flow)
+        logger.info(f"Flow {flow.endpoints.source} <-> {flow.endpoints.destination} {reason}, releasing lock")
+        if not flow.tentative:
+            self._notify_lock()
+        self._save()
+
+    def _verify(self, flow: Flow, now: float) -> None:
+        """Confirm or give up a cached flow, based on the frames its reassembler pops.
+
+        Where segments start says nothing, a single bundle spans many of them.
+        A flow that never yields a frame is given up by ``evict_idle`` after
+        ``TENTATIVE_TIMEOUT``.
+        """
+        stats = flow.reassembler.stats
+        if stats.frames >= self.CONFIRM_FRAMES:
+            logger.info(f"Cached flow {flow.endpoints.source} <-> {flow.endpoints.destination} confirmed")
+            flow.tentative = False
+            flow.last_seen = now
+            self._notify_lock()
+        elif stats.resyncs >= self.REJECT_RESYNCS or stats.skipped_bytes >= self.REJECT_SKIPPED_BYTES:
+            self._release(flow.endpoints.key, "does not carry BPSR frames")
+
+    def evict_idle(self, now: float | None = None) -> None:
+        """Release every flow that has been silent for longer than ``idle_timeout``.
+
+        Runs on every ``SWEEP_INTERVAL`` worth of traffic, but should also be
+        called on a timer: once the capture filter is narrowed to the locked
+        flows, a flow that went silent brings no traffic to trigger it.
+        ``now`` defaults to the current ``time.time()``, the clock of capture
+        timestamps.
+        """
+        with self._mutex:
+            now = time.time() if now is None else now
+            self._next_sweep = now + self.SWEEP_INTERVAL
+            logger.debug("Holding %d reassembly bytes for %d flows", self.held_bytes, len(self._flows))
+            tentative_timeout = min(self._idle_timeout, self.TENTATIVE_TIMEOUT)
+            for key in [
+                key for key, flow in self._flows.items()
+                if now - flow.last_seen > (tentative_timeout if flow.tentative else self._idle_timeout)
+            ]:
+                self._release(key, "idle")
+            for flow in self._flows.values():
+                if flow.processor.rpc is not None:
+                    flow.processor.rpc.expire(now)
 
     def handle_packet(self, packet: Packet) -> None:
-        if TCP not in packet or IP not in packet or Raw not in packet:
+        """Handle a packet dissected by scapy."""
+        if TCP not in packet or IP not in packet:
             return
 
-        try:
-            tcp_payload = bytes(packet[Raw])
-            # tcp_seq = packet[TCP].seq
-            endpoints = Endpoints.from_packet(packet)
-            # del packet
-
-            # 1) Discover/lock server flow
-            if self._known_server != endpoints:
-                if self._is_server(tcp_payload):
-                    logger.info(f"Locking to flow {endpoints.source} <-> {endpoints.destination}")
-                    self._known_server = endpoints
-                    # Reset reassembler from next expected seq
-                    # Use TCP header's sequence number; pydivert exposes it as packet.tcp.seq_num
-                    # self._reassembler.clear(tcp_seq + len(tcp_payload))
-                else:
-                    return  # don’t process the discovery packet’s payload again
-
-            # 2) Reassemble by TCP sequence number & parse frames for the locked flow
-            logger.debug(f"Reading {packet}")
-            # self._reassembler.push(tcp_seq, tcp_payload)
-            # for frame in self._reassembler.pop_frames():
-            for frame in self._processor.process_frame(tcp_payload):
-                logger.debug(f"Found {frame}")
-                try:
-                    message = self._processor.decode_payload(frame)
-                except NotImplementedError:
-                    continue
-                self._callback(message)
-        except Exception:
-            logger.exception(packet)
+        self.handle_segment(segment_from_packet(packet))
+
+    def handle_frame(self, timestamp: float, frame: memoryview) -> None:
+        """Handle a raw Ethernet frame, as delivered by ``PacketRingCapture``."""
+        segment = parse_ethernet(frame)
+        if segment is not None:
+            segment.timestamp = timestamp
+            self.handle_segment(segment)
+
+    def handle_segment(self, segment: TCPSegment, now: float | None = None) -> None:
+        """Handle a TCP segment seen at ``now``, its capture timestamp by default.
+
+        Idle timeouts and CALL round trips are measured in capture time, so
+        neither a backlog in front of the decode thread nor a replay faster
+        than real time skews them. Segments without a timestamp fall back to
+        the current ``time.time()``, the clock capture timestamps are on.
+
+        The frames found are decoded and handed to the callbacks once
+        ``_mutex`` is released, a callback blocking on a webhook call must not
+        hold up the idle sweeps.
+        """
+        found = None
+        with self._mutex:
+            try:
+                if now is None:
+                    now = time.time() if segment.timestamp is None else segment.timestamp
+                if now >= self._next_sweep:
+                    self.evict_idle(now)
+
+                if segment.flags & TCP_SYN:
+                    self._handle_open(segment.flow, now)
+                if segment.payload:
+                    found = self._handle_payload(segment, now)
+                if segment.flags & (TCP_FIN | TCP_RST):
+                    self._handle_teardown(segment.flow)
+            except Exception:
+                logger.exception(segment)
+                return
+        if found:
+            try:
+                self._dispatch(*found)
+            except Exception:
+                logger.exception(segment)
+
+    def _dispatch(self, processor: BPSRPacketProcessor, frames: list[NotifyFrame]) -> None:
+        # the frame views stay valid until the next segment is pushed, by the thread calling this
+        if self._batch_callback is not None:
+            processor.dispatch_batch(frames, self._batch_callback)
+            return
+        for frame in frames:
+            logger.debug("Found %s", frame)
+            processor.dispatch(frame, self._callback)
+
+    def _handle_open(self, key: int, now: float) -> None:
+        """Start a locked flow over when its 4-tuple is reused for a new connection."""
+        if key not in self._flows:
+            key = reverse_flow_key(key)
+            if key not in self._flows:
+                return
+        flow = self._flows[key]
+        if flow.reassembler.next_seq is None:
+            return  # nothing received yet, e.g. the SYN-ACK after the client's SYN
+        logger.info(f"Flow {flow.endpoints.source} <-> {flow.endpoints.destination} reopened, resetting its state")
+        self._retire(flow)
+        self._flows[key] = self._new_flow(flow.endpoints, last_seen=now, tentative=flow.tentative)
+
+    def _handle_teardown(self, key: int) -> None:
+        """Release a locked flow once it is closed by either side."""
+        if key in self._flows:
+            self._release(key, "closed")
+        elif (key := reverse_flow_key(key)) in self._flows:
+            self._release(key, "closed")
+
+    def _handle_payload(
+            self, segment: TCPSegment, now: float
+    ) -> tuple[BPSRPacketProcessor, list[NotifyFrame]] | None:
+        """Reassemble a segment, returns the frames it completed and the processor to dispatch them with."""
+        tcp_payload = segment.payload
+
+        # 1) Discover/lock server flow
+        flow = self._flows.get(segment.flow)
+        if flow is None and self._track_rpc:
+            client_flow = self._flows.get(reverse_flow_key(segment.flow))
+            if client_flow is not None:
+                self._handle_client_payload(client_flow, segment, now)
+                return None
+        if flow is None:
+            if not self._is_server(tcp_payload):
+                return None
+            flow = self._lock(segment.flow)
+        if not flow.tentative:
+            # left at the restore time while tentative, TENTATIVE_TIMEOUT counts from there
+            flow.last_seen = now
+
+        # 2) Reassemble by TCP sequence number & parse frames for the locked flow
+        logger.debug("Reading %s", segment)
+        if flow.reassembler.next_seq is None and not is_frame_header(tcp_payload):
+            # locked mid-frame, start the stream at the next frame boundary
+            return None
+        flow.reassembler.push(segment.seq, tcp_payload, now)
+        self._enforce_budget()
+        # parsed here, where CALLs and RETURNs are timed, decoded by the caller
+        frames = [
+            frame for data in flow.reassembler.pop_frames() for frame in flow.processor.process_frame(data, now)
+        ]
+        if flow.tentative:
+            self._verify(flow, now)
+        return flow.processor, frames
+
+    def _handle_client_payload(self, flow: Flow, segment: TCPSegment, now: float) -> None:
+        """Reassemble the client -> server stream of a flow, only for the CALLs it carries."""
+        if flow.tentative:
+            return
+        reassembler = flow.client_reassembler
+        if reassembler.next_seq is None and not is_frame_header(segment.payload):
+            return
+        reassembler.push(segment.seq, segment.payload, now)
+        self._enforce_budget()
+        for data in reassembler.pop_frames():
+            for frame in flow.processor.process_frame(data, now):
+                logger.debug("Ignoring %s sent by the client", frame)
 
 
 class BPSRDefaultSniffer(Sniffer):
+    NAME = "world"
     SIGNATURE = b"\x00\x63\x33\x53\x42\x00"  # 00 63 33 53 42 00
     SIGNATURE1 = b"\x00\x00\x00\x62\x00\x03\x00\x00\x00\x01"
     SIGNATURE2 = b"\x00\x00\x00\x00\x0a\x4e"
 
-    def _is_scene_change(self, payload: bytes) -> bool:
+    @staticmethod
+    def _is_scene_change(payload: memoryview | bytes, start: int) -> bool:
         """Check if a small packet contains the magic signature used to find
         the game server during scene changes.
+
+        ``start`` is where the signature was found; it only counts when it
+        sits at offset 5 of one of the fragments that follow the first 10 bytes.
         """
         # 5th byte (index 4) must be zero
         if len(payload) < 10 or payload[4] != 0:
             return False
-        reader = BinaryReader(payload[10:])
-        # Walk through fragments within the TCP payload looking for the
-        # signature at offset 5 of the fragment.
-        while reader.remaining() >= 4:
-            frag_len = reader.read_u32()
-            frag_len_minus_hdr = frag_len - 4
-            if reader.remaining() < frag_len_minus_hdr:
+        # Walk through the fragment length prefixes without copying fragments
+        pos = 10
+        while len(payload) - pos >= 4:
+            frag_len = _U32.unpack_from(payload, pos)[0]
+            if frag_len < 4 or len(payload) - pos - 4 < frag_len - 4:
+                break
+            if pos + 9 == start and frag_len - 4 >= 11:
+                return True
+            if pos + 9 > start:
                 break
-            frag = reader.read(frag_len_minus_hdr)
-            if len(frag) >= 5 + len(self.SIGNATURE):
-                if frag[5: 5 + len(self.SIGNATURE)] == self.SIGNATURE:
-                    return True
+            pos += frag_len
         return False
 
-    def _is_login_packet(self, payload: bytes) -> bool:
-        """Detect a login response packet based on fixed signatures.
-
-        When the user first logs in the server’s address can be
-        discovered by looking for a payload length of 98 bytes along
-        with two fixed signatures in the header.
-        """
-        return (
-                len(payload) == 98
-                and payload.startswith(self.SIGNATURE1)
-                and payload[14:20] == self.SIGNATURE2
-        )
-
-    @override
-    def _is_server(self, payload: bytes) -> bool:
-        return self._is_scene_change(payload) or self._is_login_packet(payload)
+    SIGNATURES = (
+        Signature.contains(SIGNATURE, _is_scene_change),
+        # Login response: when the user first logs in the server’s address can be
+        # discovered by looking for a payload length of 98 bytes along with two
+        # fixed signatures in the header.
+        Signature(re.escape(SIGNATURE1) + rb".{4}" + re.escape(SIGNATURE2) + rb".{78}\Z", anchored=True),
+    )
 
 
 class BPSRChatSniffer(Sniffer):
+    NAME = "chat"
     SIGNATURE = bytes.fromhex("0000009a00020000000004a84519")
     SIGNATURE_2 = bytes.fromhex("00020000000009d4a768")
 
-    @override
-    def _is_server(self, payload: bytes) -> bool:
-        return payload.startswith(self.SIGNATURE) or self.SIGNATURE_2 in payload
+    SIGNATURES = (
+        Signature.prefix(SIGNATURE),
+        Signature.contains(SIGNATURE_2),
+    )
+
+
+PROFILES: dict[str, type[Sniffer]] = {sniffer.NAME: sniffer for sniffer in (BPSRChatSniffer, BPSRDefaultSniffer)}
+
+
+class SnifferGroup:
+    """Fan a single capture out to several sniffer profiles.
+
+    Headers are parsed once per packet and the segment is handed to every
+    sniffer, each keeping its own flow table and processors. A segment of a
+    flow already locked by one sniffer only goes to that sniffer. The group
+    takes over the lock notifications of its sniffers, and narrows the
+    capture filter only once every sniffer is full.
+    """
+
+    def __init__(
+            self,
+            sniffers: list[Sniffer],
+            on_lock: Callable[[list[Endpoints] | None], None] | None = None
+    ):
+        self._sniffers = sniffers
+        self._on_lock = on_lock
+        self._matcher = SignatureMatcher([type(sniffer).SIGNATURES for sniffer in sniffers])
+        for sniffer in sniffers:
+            sniffer._on_lock = self._notify_lock
+
+    @property
+    def flows(self) -> list[Endpoints]:
+        return [endpoints for sniffer in self._sniffers for endpoints in sniffer.flows]
+
+    @property
+    def held_bytes(self) -> int:
+        return sum(sniffer.held_bytes for sniffer in self._sniffers)
+
+    def evict_idle(self, now: float | None = None) -> None:
+        for sniffer in self._sniffers:
+            sniffer.evict_idle(now)
+
+    def reassembly_stats(self) -> ReassemblyStats:
+        stats = ReassemblyStats()
+        for sniffer in self._sniffers:
+            stats.add(sniffer.reassembly_stats())
+        return stats
+
+    def rpc_latencies(self) -> RpcTracker:
+        rpc = RpcTracker()
+        for sniffer in self._sniffers:
+            rpc.add(sniffer.rpc_latencies())
+        return rpc
+
+    def _notify_lock(self, _endpoints: list[Endpoints] | None) -> None:
+        if self._on_lock is not None:
+            self._on_lock(self.flows if all(sniffer.is_full for sniffer in self._sniffers) else None)
+
+    def handle_packet(self, packet: Packet) -> None:
+        """Handle a packet dissected by scapy."""
+        if TCP in packet and IP in packet:
+            self.handle_segment(segment_from_packet(packet))
+
+    def handle_frame(self, timestamp: float, frame: memoryview) -> None:
+        """Handle a raw Ethernet frame, as delivered by ``PacketRingCapture``."""
+        segment = parse_ethernet(frame)
+        if segment is not None:
+            segment.timestamp = timestamp
+            self.handle_segment(segment)
+
+    def handle_segment(self, segment: TCPSegment, now: float | None = None) -> None:
+        reverse = reverse_flow_key(segment.flow)
+        for sniffer in self._sniffers:
+            if sniffer.is_locked(segment.flow) or sniffer.is_locked(reverse):
+                sniffer.handle_segment(segment, now)
+                return
+
+        # a single scan decides which profile, if any, a new flow belongs to
+        if segment.payload:
+            index = self._matcher.match(segment.payload)
+            if index is not None:
+                self._sniffers[index].handle_segment(segment, now)
@@ -0,0 +1,46 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class FlowLockCache:
+    """Small JSON file remembering the locked flows of each sniffer profile.
+
+    Flows are stored as ``(source_ip, source_port, destination_ip, destination_port)``.
+
+    Lets a restarted relay reattach to the flows it was following instead of
+    waiting for the next login or scene change packet.
+    """
+
+    def __init__(self, path: Path | str):
+        self._path = Path(path)
+
+    def _read(self) -> dict[str, list[list]]:
+        try:
+            return json.loads(self._path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            logger.warning(f"Ignoring unreadable flow lock cache {self._path}", exc_info=True)
+            return {}
+
+    def load(self, profile: str) -> list[tuple[str, int, str, int]]:
+        try:
+            return [(str(src), int(sport), str(dst), int(dport)) for src, sport, dst, dport in self._read().get(profile, [])]
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring malformed {profile!r} entry in flow lock cache {self._path}")
+            return []
+
+    def save(self, profile: str, flows: list[tuple[str, int, str, int]]) -> None:
+        state = self._read()
+        state[profile] = [list(flow) for flow in flows]
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self._path.with_suffix(self._path.suffix + ".tmp")
+            tmp.write_text(json.dumps(state), encoding="utf-8")
+            os.replace(tmp, self._path)
+        except OSError:
+            logger.warning(f"Failed to write flow lock cache {self._path}", exc_info=True)
@@ -1,91 +1,423 @@
 import struct
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Callable, Self
+
+_U16 = struct.Struct(">H")
+_U32 = struct.Struct(">I")
+_U64 = struct.Struct(">Q")
 
 
 class BinaryReader:
-    """Helper to read big‑endian data from a bytes object.
+    """Helper to read big‑endian data from a buffer without copying it.
 
     Instances maintain a cursor into an internal buffer.  Note that all
-    multibyte values in the BPSR protocol are big‑endian.
+    multibyte values in the BPSR protocol are big‑endian.  Integers are
+    unpacked in place and ``read`` returns views into the buffer, so they
+    are only valid as long as the buffer is; ``bytes()`` one to keep it.
     """
 
-    def __init__(self, data: bytes):
+    def __init__(self, data: bytes | bytearray | memoryview):
         self._buffer = memoryview(data)
         self._pos = 0
 
     def remaining(self) -> int:
         return len(self._buffer) - self._pos
 
-    def read(self, length: int) -> bytes:
-        if self._pos + length > len(self._buffer):
+    def read(self, length: int) -> memoryview:
+        end = self._pos + length
+        if end > len(self._buffer):
+            raise EOFError("unexpected end of buffer")
+        view = self._buffer[self._pos:end]
+        self._pos = end
+        return view
+
+    def _unpack(self, fmt: struct.Struct) -> int:
+        if self._pos + fmt.size > len(self._buffer):
             raise EOFError("unexpected end of buffer")
-        b = self._buffer[self._pos: self._pos + length].tobytes()
-        self._pos += length
-        return b
+        value = fmt.unpack_from(self._buffer, self._pos)[0]
+        self._pos += fmt.size
+        return value
 
     def peek_u32(self) -> int:
         if self.remaining() < 4:
             raise EOFError
-        return struct.unpack_from(">I", self._buffer, self._pos)[0]
+        return _U32.unpack_from(self._buffer, self._pos)[0]
 
     def read_u16(self) -> int:
-        return struct.unpack(">H", self.read(2))[0]
+        return self._unpack(_U16)
 
     def read_u32(self) -> int:
-        return struct.unpack(">I", self.read(4))[0]
+        return self._unpack(_U32)
 
     def read_u64(self) -> int:
-        return struct.unpack(">Q", self.read(8))[0]
+        return self._unpack(_U64)
 
-    def read_remaining(self) -> bytes:
+    def read_remaining(self) -> memoryview:
         return self.read(self.remaining())
 
 
-class TCPReassembler:
-    """Simple TCP stream reassembler.
+@dataclass(slots=True)
+class ReassemblyStats:
+    """Counters kept by ``TCPReassembler``.
+
+    Attributes:
+        frames: Complete frames handed out by ``pop_frames``.
+        spanning_frames: Frames split across several segments, which only
+            reassembly recovers.
+        duplicate_bytes: Retransmitted or overlapping bytes that were dropped.
+        resyncs: Times the stream was picked back up at the next frame header,
+            after a lost segment or a corrupt length prefix.
+        skipped_bytes: Received bytes dropped while resynchronising.
+        lost_bytes: Bytes never received, jumped over when a gap was given up.
+        evicted_bytes: Held bytes dropped to stay within a memory budget.
+    """
+
+    frames: int = 0
+    spanning_frames: int = 0
+    duplicate_bytes: int = 0
+    resyncs: int = 0
+    skipped_bytes: int = 0
+    lost_bytes: int = 0
+    evicted_bytes: int = 0
+
+    def add(self, other: Self) -> None:
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+def seq_diff(a: int, b: int) -> int:
+    """Signed distance from sequence number ``b`` to ``a``, modulo 2**32."""
+    return ((a - b + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+class SegmentStore:
+    """Out-of-order stream data as sorted, non-overlapping intervals.
+
+    Positions are absolute stream offsets rather than sequence numbers, so
+    ordering is unaffected by wraparound. Inserting merges the new data with
+    every interval it overlaps or touches, keeping the bytes that arrived
+    first, so a retransmission starting mid-segment or spanning two held
+    segments collapses into one interval instead of lingering.
 
-    Maintains an ordered map of sequence numbers to payloads and yields
-    contiguous data when possible.  Only one stream is tracked at a time,
-    matching the behaviour of the Rust code where the game server is
-    identified and then the sniffer begins reassembling that connection.
+    Each interval is held as the list of pieces it was built from and only
+    joined when it is popped, so merging copies no more than the new bytes,
+    however long the interval has grown.
     """
 
     def __init__(self) -> None:
-        self.cache: dict[int, bytes] = {}  # seq_num -> payload
+        self._starts: list[int] = []
+        self._ends: list[int] = []
+        self._pieces: list[list[bytes]] = []
+        # arrival order of the oldest data in each interval, for eviction
+        self._arrivals: list[int] = []
+        self._arrived = 0
+        self.size = 0  # bytes held
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    @property
+    def first(self) -> int:
+        """Stream offset of the earliest held interval."""
+        return self._starts[0]
+
+    def clear(self) -> None:
+        self._starts.clear()
+        self._ends.clear()
+        self._pieces.clear()
+        self._arrivals.clear()
+        self.size = 0
+
+    def insert(self, start: int, data: bytes | memoryview) -> int:
+        """Hold ``data`` at stream offset ``start``, returns how many of its bytes were already held."""
+        end = start + len(data)
+        starts, ends, pieces, arrivals = self._starts, self._ends, self._pieces, self._arrivals
+        self._arrived += 1
+        first = bisect_right(starts, start) - 1
+        if first < 0 or ends[first] < start:
+            first += 1
+        last = first
+        while last < len(starts) and starts[last] <= end:
+            last += 1
+
+        if first == last:
+            starts.insert(first, start)
+            ends.insert(first, end)
+            pieces.insert(first, [bytes(data)])
+            arrivals.insert(first, self._arrived)
+            self.size += len(data)
+            return 0
+
+        # only the parts of data in front of, between and behind the held intervals are new
+        merged = pieces[first]
+        added = 0
+        if start < starts[first]:
+            merged.insert(0, bytes(data[:starts[first] - start]))
+            added += starts[first] - start
+            starts[first] = start
+        position = ends[first]
+        for index in range(first + 1, last):
+            merged.append(bytes(data[position - start:starts[index] - start]))
+            merged.extend(pieces[index])
+            added += starts[index] - position
+            position = ends[index]
+        if end > position:
+            merged.append(bytes(data[position - start:]))
+            added += end - position
+            position = end
+        ends[first] = position
+        arrivals[first] = min(arrivals[first:last])
+        del starts[first + 1:last], ends[first + 1:last], pieces[first + 1:last], arrivals[first + 1:last]
+        self.size += added
+        return len(data) - added
+
+    def pop_until(self, position: int) -> list[tuple[int, bytes]]:
+        """Remove and return the ``(start, data)`` intervals starting at or before ``position``."""
+        count = bisect_right(self._starts, position)
+        popped = [
+            (start, chunks[0] if len(chunks) == 1 else b"".join(chunks))
+            for start, chunks in zip(self._starts[:count], self._pieces[:count])
+        ]
+        del self._starts[:count], self._ends[:count], self._pieces[:count], self._arrivals[:count]
+        self.size -= sum(len(chunk) for _, chunk in popped)
+        return popped
+
+    def evict_oldest(self) -> int:
+        """Drop the interval holding the oldest data, returns its size."""
+        index = self._arrivals.index(min(self._arrivals))
+        size = self._ends[index] - self._starts[index]
+        del self._starts[index], self._ends[index], self._pieces[index], self._arrivals[index]
+        self.size -= size
+        return size
+
+
+class TCPReassembler:
+    """TCP stream reassembler.
+
+    Holds out-of-order segments in a ``SegmentStore`` and buffers the
+    contiguous stream from ``next_seq`` on. Sequence numbers are compared
+    modulo 2**32, so the stream survives a wraparound, and bytes before
+    ``next_seq`` (retransmissions, overlapping segments) are trimmed off.
+
+    The stream lives between a read and a write offset in a reusable buffer.
+    Popping frames only advances the read offset, the unread tail is moved to
+    the front only when the buffer runs out of room at the end.
+
+    A missing segment is waited for until too much data piles up behind it or
+    too much time passes. The stream then skips ahead to the held data and
+    resumes at the next frame header found in it.
+
+    Memory is bounded by ``max_held``: past it the oldest out-of-order
+    segments are evicted, and a frame length above ``max_frame_length`` is
+    treated as corrupt rather than waited for.
+    """
+
+    INITIAL_SIZE = 1 << 16
+
+    def __init__(
+            self,
+            find_frame: Callable[[memoryview, int, int], int] | None = None,
+            gap_bytes: int = 1 << 18,
+            gap_timeout: float = 2.0,
+            max_frame_length: int = 1 << 24,
+            max_held: int = 1 << 25
+    ) -> None:
+        """
+        Args:
+            find_frame: Returns the offset of the first plausible frame header
+                in ``buffer[start:end]``, or -1. Used to resume after a gap or a
+                corrupt length prefix; without it, the bytes that cannot be
+                framed are dropped up to the next segment boundary.
+            gap_bytes: Out-of-order bytes held behind a missing segment before
+                it is given up.
+            gap_timeout: Seconds a missing segment is waited for.
+            max_frame_length: Longest frame length prefix considered sane.
+            max_held: Bytes this reassembler may hold, out-of-order segments
+                and the buffered stream together.
+        """
+        self._find_frame = find_frame
+        self._max_frame_length = max_frame_length
+        self._max_held = max_held
+        self._gap_bytes = gap_bytes
+        self._gap_timeout = gap_timeout
+        self._gap_since: float | None = None  # when the stream last stalled on a missing segment
+        self._resyncing = False
+        self.pending = SegmentStore()
         self.next_seq: int | None = None
-        self._data = bytearray()
+        self._position = 0  # stream offset of next_seq
+        self.stats = ReassemblyStats()
+        self._buffer = bytearray(self.INITIAL_SIZE)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # read offset
+        self._end = 0  # write offset
+        # buffered bytes that were already there before the last push
+        self._carried = 0
+
+    @property
+    def buffered(self) -> int:
+        """Contiguous bytes waiting for the rest of their frame."""
+        return self._end - self._start
+
+    @property
+    def held(self) -> int:
+        """Bytes held, buffered and out-of-order."""
+        return self._end - self._start + self.pending.size
+
+    def evict(self, size: int) -> int:
+        """Drop at least ``size`` held bytes, oldest out-of-order segments first.
+
+        If that is not enough, the buffered partial frame goes too and the
+        stream resumes at the next frame header. Returns the bytes dropped.
+        """
+        evicted = 0
+        while evicted < size and self.pending:
+            evicted += self.pending.evict_oldest()
+        if evicted < size and self._end > self._start:
+            evicted += self._end - self._start
+            self._start = self._end = 0
+            self._carried = 0
+            self._resyncing = self._find_frame is not None
+        self.stats.evicted_bytes += evicted
+        return evicted
 
     def clear(self, seq: int) -> None:
-        self.cache.clear()
+        self.pending.clear()
         self.next_seq = seq
-        self._data.clear()
+        self._position = 0
+        self._start = self._end = 0
+        self._carried = 0
+        self._gap_since = None
+        self._resyncing = False
+
+    def _reserve(self, size: int) -> None:
+        used = self._end - self._start
+        if used + size > len(self._buffer):
+            # a new buffer rather than a resize, popped frames may still be viewed
+            buffer = bytearray(max(used + size, 2 * len(self._buffer)))
+            buffer[:used] = self._view[self._start:self._end]
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+        else:
+            self._view[:used] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = used
 
-    def push(self, seq: int, payload: bytes) -> None:
+    def _append(self, payload: bytes | memoryview) -> None:
+        size = len(payload)
+        if self._end + size > len(self._buffer):
+            self._reserve(size)
+        self._view[self._end:self._end + size] = payload
+        self._end += size
+        self.next_seq = (self.next_seq + size) & 0xFFFFFFFF
+        self._position += size
+
+    def push(self, seq: int, payload: bytes | memoryview, now: float | None = None) -> None:
         if not payload:
             return
-        self.cache.setdefault(seq, payload)
         # establish the next expected sequence if unknown
         if self.next_seq is None:
             self.next_seq = seq
-        # buffer contiguous segments
-        while self.next_seq in self.cache:
-            seg = self.cache.pop(self.next_seq)
-            self._data.extend(seg)
-            self.next_seq = (self.next_seq + len(seg)) & 0xFFFFFFFF
+        self._carried = self._end - self._start
+        position = self._position
+
+        offset = seq_diff(seq, self.next_seq)
+        if offset > 0:
+            self.stats.duplicate_bytes += self.pending.insert(self._position + offset, payload)
+        else:
+            self._append_trimmed(-offset, payload)
+            self._drain()
+
+        if self.held > self._max_held:
+            self.evict(self.held - self._max_held)
+
+        if not self.pending:
+            self._gap_since = None
+            return
+        now = time.monotonic() if now is None else now
+        if self._gap_since is None or self._position != position:
+            self._gap_since = now
+        if self.pending.size >= self._gap_bytes or now - self._gap_since >= self._gap_timeout:
+            self._skip_gap(now)
+
+    def _drain(self) -> None:
+        """Buffer held segments that became contiguous."""
+        for start, data in self.pending.pop_until(self._position):
+            self._append_trimmed(self._position - start, data)
 
-    def pop_frames(self) -> list[bytes]:
+    def _skip_gap(self, now: float) -> None:
+        """Give up on the missing segment and continue from the held data."""
+        first = self.pending.first
+        self.stats.resyncs += 1
+        self.stats.lost_bytes += first - self._position
+        # the partial frame in front of the gap can never complete
+        self.stats.skipped_bytes += self._end - self._start
+        self._start = self._end = 0
+        self._carried = 0
+        self.next_seq = (self.next_seq + first - self._position) & 0xFFFFFFFF
+        self._position = first
+        self._drain()
+        self._resyncing = True
+        self._gap_since = now if self.pending else None
+
+    def _resync(self, start: int, end: int) -> int:
+        """Skip to the next plausible frame header in ``buffer[start:end]``, returns the new read offset."""
+        found = -1 if self._find_frame is None else self._find_frame(self._view, start, end)
+        if found < 0:
+            # a header may straddle the end of what is buffered so far
+            found = end if self._find_frame is None else max(start, end - 5)
+        self._resyncing = self._find_frame is not None and found + 6 > end
+        self.stats.skipped_bytes += found - start
+        return found
+
+    def _append_trimmed(self, overlap: int, payload: bytes | memoryview) -> None:
+        """Append ``payload`` minus its first ``overlap`` bytes, which are already buffered."""
+        if overlap >= len(payload):
+            self.stats.duplicate_bytes += len(payload)
+            return
+        self.stats.duplicate_bytes += overlap
+        self._append(payload[overlap:] if overlap else payload)
+
+    def pop_frames(self) -> list[memoryview]:
         """Extract complete length‑prefixed frames from the buffered data.
 
         The BPSR protocol prefixes each frame with a 32‑bit big‑endian
         length.  If not enough data is available for a complete frame
         nothing is returned.
+
+        Frames are views into the reassembly buffer, only valid until the
+        next ``push`` or ``clear``.
         """
-        frames: list[bytes] = []
-        while len(self._data) >= 4:
-            frame_len = struct.unpack(">I", self._data[:4])[0]
-            if len(self._data) < frame_len:
+        frames: list[memoryview] = []
+        start, end = self._start, self._end
+        carried_end = start + max(self._carried, 0)
+        unpack_from, buffer, view = _U32.unpack_from, self._buffer, self._view
+        if self._resyncing:
+            start = self._resync(start, end)
+        while not self._resyncing and end - start >= 4:
+            frame_len = unpack_from(buffer, start)[0]
+            if frame_len < 6 or frame_len > self._max_frame_length:
+                # corrupt length prefix, look for the next frame past it
+                self.stats.resyncs += 1
+                self.stats.skipped_bytes += 1
+                start = self._resync(start + 1, end)
+                continue
+            if end - start < frame_len:
                 break
-            # slice out the complete frame and remove it from buffer
-            frame = bytes(self._data[:frame_len])
-            del self._data[:frame_len]
-            frames.append(frame)
+            if start < carried_end:
+                self.stats.spanning_frames += 1
+            frames.append(view[start:start + frame_len])
+            start += frame_len
+        self._carried = carried_end - start
+
+        if start == end:
+            # nothing left to keep, rewind for free
+            start = end = 0
+            if len(self._buffer) > 4 * self.INITIAL_SIZE:
+                # give back the room a large frame needed
+                self._buffer = bytearray(self.INITIAL_SIZE)
+                self._view = memoryview(self._buffer)
+        self._start, self._end = start, end
+        self.stats.frames += len(frames)
         return frames
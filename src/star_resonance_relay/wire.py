@@ -0,0 +1,91 @@
+"""Just enough of the protobuf wire format to peek at a field without parsing the message."""
+from typing import Sequence
+
+WIRE_VARINT = 0
+WIRE_I64 = 1
+WIRE_LEN = 2
+WIRE_I32 = 5
+
+
+def read_varint(data: bytes | memoryview, offset: int) -> tuple[int, int]:
+    """Read a base 128 varint at ``offset``, returns ``(value, offset after it)``.
+
+    Raises:
+        IndexError: If the varint runs past the end of ``data``.
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def _leading_varint(data: bytes | memoryview, path: Sequence[int]) -> int | None:
+    # every field on the path written first in its message, as the generated serializers do
+    # for field 1, and a one byte value, all within the enclosing submessages
+    offset, end = 0, len(data)
+    for number in path[:-1]:
+        if offset >= end or data[offset] != number << 3 | WIRE_LEN:
+            return None
+        length, offset = read_varint(data, offset + 1)
+        if length == 0 or offset + length > end:
+            return None
+        end = offset + length
+    if offset + 2 > end or data[offset] != path[-1] << 3 | WIRE_VARINT:
+        return None
+    value = data[offset + 1]
+    return value if value < 0x80 else None
+
+
+def find_varint(data: bytes | memoryview, path: Sequence[int], default: int = 0) -> int | None:
+    """Value of the varint field at ``path``, e.g. ``(1, 1)`` for field 1 of the message in field 1.
+
+    Every field but the last must be a length-delimited (message) field. The
+    scan stops at the first occurrence of each field, serializers write a
+    singular field once, so fields near the front of a message are cheap to
+    read. Returns ``default`` if a field on the path is absent, and None if
+    ``data`` is not valid wire format up to that point.
+    """
+    try:
+        value = _leading_varint(data, path)
+        if value is not None:
+            return value
+    except IndexError:
+        pass
+
+    offset, end = 0, len(data)
+    last = len(path) - 1
+    try:
+        for depth, number in enumerate(path):
+            while True:
+                if offset >= end:
+                    return default if offset == end else None
+                tag = data[offset]
+                if tag < 0x80:
+                    offset += 1
+                else:
+                    tag, offset = read_varint(data, offset)
+                field, wire_type = tag >> 3, tag & 0x07
+                if wire_type == WIRE_VARINT:
+                    value, offset = read_varint(data, offset)
+                    if field == number and depth == last:
+                        return value
+                elif wire_type == WIRE_LEN:
+                    length, offset = read_varint(data, offset)
+                    if field == number and depth != last:
+                        end = offset + length
+                        break
+                    offset += length
+                elif wire_type == WIRE_I64:
+                    offset += 8
+                elif wire_type == WIRE_I32:
+                    offset += 4
+                else:
+                    return None
+    except IndexError:
+        return None
+    return default